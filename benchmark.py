@@ -0,0 +1,331 @@
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from string import Template
+from urllib.parse import parse_qs, urlparse
+
+# Recorded site markup; $placeholders are filled in per page and per title
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+CARDS_PER_PAGE = 24
+
+# URL path segment of detail pages and listing heading for each content type
+KINDS = {
+    'movies': ('movie', 'Movies'),
+    'series': ('serie', 'TV Series'),
+}
+GENRES = ['Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Drama', 'Fantasy', 'Horror', 'Mystery', 'Thriller']
+
+class FixtureSite:
+    """Render listing, detail and poster responses from the fixture templates."""
+
+    def __init__(self, pages, fixtures_dir=FIXTURES_DIR):
+        self.pages = pages
+        self.listing = Template((fixtures_dir / 'listing.html').read_text())
+        self.card = Template((fixtures_dir / 'card.html').read_text())
+        self.pagination = Template((fixtures_dir / 'pagination.html').read_text())
+        self.details = {kind: Template((fixtures_dir / f'detail_{kind}.html').read_text()) for kind in KINDS}
+        self.poster_bytes = (fixtures_dir / 'poster.jpg').read_bytes()
+
+    def _values(self, kind, n):
+        path = KINDS[kind][0]
+        return {
+            'path': path,
+            'slug': f"{path}-{n}",
+            'title': f"{KINDS[kind][1]} Title {n}",
+            'imdb': f"{5 + n % 5}.{n % 10}",
+            'year': 1990 + n % 35,
+            'duration': f"{80 + n % 60} min",
+            'seasons': f"SS {1 + n % 8}",
+            'country': ['United States', 'United Kingdom', 'France', 'Japan', 'South Korea'][n % 5],
+            'release_date': f"{['Jan', 'Mar', 'Jun', 'Sep', 'Nov'][n % 5]} {1 + n % 28:02d}, {1990 + n % 35}",
+            'description': f"Recorded synopsis number {n}. " * 8,
+            'genre1': GENRES[n % len(GENRES)],
+            'genre2': GENRES[(n * 7 + 3) % len(GENRES)],
+            'trailer': f"bench{n:06d}",
+        }
+
+    def listing_page(self, kind, page):
+        """Return a listing page; pages past the configured count have no cards, like the real site."""
+        cards = []
+        if page <= self.pages:
+            start = (page - 1) * CARDS_PER_PAGE
+            cards = [self.card.substitute(self._values(kind, n)) for n in range(start, start + CARDS_PER_PAGE)]
+        pagination = self.pagination.substitute(page=page, next=page + 1) if page < self.pages else ''
+        return self.listing.substitute(heading=KINDS[kind][1], page=page, cards='\n'.join(cards), pagination=pagination)
+
+    def detail_page(self, kind, n):
+        return self.details[kind].substitute(self._values(kind, n))
+
+    def poster(self, slug):
+        # Trailing bytes after the JPEG end marker keep every poster's content hash distinct
+        return self.poster_bytes + slug.encode()
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serve fixture responses with the server's latency and injected errors."""
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        roll = random.random()
+        if roll < server.throttle_rate:
+            return self._send(429, b'', 'text/plain', {'Retry-After': '0'})
+        if roll < server.throttle_rate + server.error_rate:
+            return self._send(500, b'', 'text/plain')
+
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        try:
+            if len(parts) == 1 and parts[0] in KINDS:
+                page = int(parse_qs(url.query).get('page', ['1'])[0])
+                return self._send(200, server.site.listing_page(parts[0], page).encode(), 'text/html; charset=utf-8')
+            if len(parts) == 2 and parts[0] == 'img':
+                return self._send(200, server.site.poster(parts[1]), 'image/jpeg')
+            if len(parts) == 2:
+                kind = next(kind for kind, (path, _) in KINDS.items() if path == parts[0])
+                n = int(parts[1].rsplit('-', 1)[1])
+                return self._send(200, server.site.detail_page(kind, n).encode(), 'text/html; charset=utf-8')
+        except (StopIteration, ValueError, IndexError):
+            pass
+        self._send(404, b'Not found', 'text/plain')
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+def serve(args):
+    """Run the stand-in server in the foreground until interrupted."""
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), FixtureHandler)
+    server.daemon_threads = True
+    server.site = FixtureSite(args.pages)
+    server.latency = args.latency
+    server.error_rate = args.error_rate
+    server.throttle_rate = args.throttle_rate
+    print(f"Serving {args.pages} fixture pages per content type on http://127.0.0.1:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _wait_for_port(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"Benchmark server did not start on port {port}")
+
+def current_rss():
+    """Return this process's resident memory in bytes, or its peak where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class RssSampler(threading.Thread):
+    """Sample resident memory at a fixed interval while a benchmark runs."""
+
+    def __init__(self, interval=0.1):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.samples.append(current_rss())
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        self.samples.append(current_rss())
+
+    def summary(self):
+        """Peak RSS of the first and last quarters of the run and the growth between them, in MB.
+
+        The first quarter absorbs warm-up (imports, connection pools, worker threads), so
+        a crawl whose memory is bounded shows near-zero growth however many pages it walks.
+        """
+        quarter = max(1, len(self.samples) // 4)
+        warm, end = max(self.samples[:quarter]), max(self.samples[-quarter:])
+        return {
+            'rss_warm_mb': round(warm / 1024 / 1024, 1),
+            'rss_end_mb': round(end / 1024 / 1024, 1),
+            'rss_growth_mb': round((end - warm) / 1024 / 1024, 1),
+        }
+
+def run_once(args):
+    """Scrape movies and series from a fresh stand-in server and return the measurements."""
+    port = _free_port()
+    server = subprocess.Popen([sys.executable, str(Path(__file__).resolve()), 'serve', '--port', str(port),
+                               '--pages', str(args.pages), '--latency', str(args.latency),
+                               '--error-rate', str(args.error_rate), '--throttle-rate', str(args.throttle_rate)],
+                              stdout=subprocess.DEVNULL)
+    workdir = tempfile.mkdtemp(prefix='scraper-bench-')
+    try:
+        _wait_for_port(port)
+        os.environ['SCRAPER_BASE_URL'] = f"http://127.0.0.1:{port}"
+        os.chdir(workdir)
+
+        # Override settings before the scraper modules import them
+        import config
+        config.BASE_URL = os.environ['SCRAPER_BASE_URL']
+        config.DATABASE_PATH = Path(workdir) / 'bench.db'
+        config.HTTP_CACHE_ENABLED = False
+        config.RATE_LIMIT = config.RATE_LIMIT_MAX = args.rate
+        config.BACKOFF_BASE = args.backoff
+        config.CONCURRENT_SCRAPING = args.workers > 1
+        config.MAX_WORKERS = args.workers
+        config.MAX_CONNECTIONS_PER_HOST = max(args.workers, config.MAX_CONNECTIONS_PER_HOST)
+        config.POOL_MAXSIZE = max(args.workers, config.POOL_MAXSIZE)
+        config.IMAGE_PIPELINE = not args.no_images
+
+        import engine
+        import metrics
+        from db import get_connection, init_db
+        from image_pipeline import get_pipeline
+        from movies import MOVIES, scrape_movies
+        from series import SERIES, scrape_series
+        if args.no_images:
+            engine.download_image = lambda image_url, title, save_dir: None
+
+        init_db()
+        sampler = RssSampler()
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            scrape_movies()
+            scrape_series()
+            if get_pipeline():
+                get_pipeline().wait()
+        finally:
+            sampler.stop()
+        elapsed = time.perf_counter() - started
+
+        conn = get_connection()
+        cards = sum(conn.execute(f"SELECT COUNT(*) FROM {spec.table}").fetchone()[0] for spec in (MOVIES, SERIES))
+        images = sum(conn.execute(f"SELECT COUNT(image) FROM {spec.table}").fetchone()[0] for spec in (MOVIES, SERIES))
+    finally:
+        server.terminate()
+        server.wait()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    stages = metrics.summary()['stages']
+    pages = stages.get('parse_listing', {}).get('count', 0)
+    parse_seconds = sum(stages[name]['total_seconds'] for name in ('parse_listing', 'parse_details') if name in stages)
+    db_seconds = sum(stages[name]['total_seconds'] for name in ('exists_check', 'insert') if name in stages)
+    return {
+        'workers': args.workers,
+        'pages': pages,
+        'cards': cards,
+        'images': images,
+        'elapsed_seconds': round(elapsed, 3),
+        'pages_per_second': round(pages / elapsed, 2) if elapsed else 0.0,
+        'cards_per_second': round(cards / elapsed, 2) if elapsed else 0.0,
+        'parse_seconds': round(parse_seconds, 3),
+        'db_seconds': round(db_seconds, 3),
+        'peak_memory_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        **sampler.summary(),
+        'stages': stages,
+    }
+
+REPORT_COLUMNS = ['workers', 'pages', 'cards', 'images', 'elapsed_seconds', 'pages_per_second', 'cards_per_second',
+                  'parse_seconds', 'db_seconds', 'peak_memory_mb', 'rss_warm_mb', 'rss_end_mb', 'rss_growth_mb']
+
+def print_report(results):
+    widths = [max(len(column), *(len(str(result[column])) for result in results)) for column in REPORT_COLUMNS]
+    print('  '.join(column.rjust(width) for column, width in zip(REPORT_COLUMNS, widths)))
+    for result in results:
+        print('  '.join(str(result[column]).rjust(width) for column, width in zip(REPORT_COLUMNS, widths)))
+
+def run(args):
+    """Benchmark every requested worker count, each in its own process so no state is shared between runs."""
+    worker_counts = [int(count) for count in args.workers.split(',')]
+    results = []
+    for workers in worker_counts:
+        command = [sys.executable, str(Path(__file__).resolve()), 'once', '--workers', str(workers),
+                   '--pages', str(args.pages), '--latency', str(args.latency), '--error-rate', str(args.error_rate),
+                   '--throttle-rate', str(args.throttle_rate), '--rate', str(args.rate), '--backoff', str(args.backoff)]
+        if args.no_images:
+            command.append('--no-images')
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    print_report(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the scrapers against a local server serving recorded fixtures.")
+    commands = parser.add_subparsers(dest='command')
+
+    def add_site_options(command):
+        command.add_argument('--pages', type=int, default=5, help="listing pages per content type")
+        command.add_argument('--latency', type=float, default=0.02, help="seconds the server waits before every response")
+        command.add_argument('--error-rate', type=float, default=0.0, help="fraction of responses that are 500 errors")
+        command.add_argument('--throttle-rate', type=float, default=0.0, help="fraction of responses that are 429 throttles")
+
+    def add_run_options(command):
+        add_site_options(command)
+        command.add_argument('--rate', type=float, default=1000.0, help="requests per second allowed by the rate limiter")
+        command.add_argument('--backoff', type=float, default=0.05, help="retry backoff base in seconds")
+        command.add_argument('--no-images', action='store_true', help="skip poster downloads")
+
+    run_command = commands.add_parser('run', help="benchmark one or more worker counts and print a report")
+    add_run_options(run_command)
+    run_command.add_argument('--workers', default='1', help="comma-separated worker counts to compare, e.g. 1,4,8")
+    run_command.add_argument('--json', help="also write the results to this JSON file")
+
+    once_command = commands.add_parser('once', help="run a single benchmark and print its result as JSON")
+    add_run_options(once_command)
+    once_command.add_argument('--workers', type=int, default=1)
+
+    serve_command = commands.add_parser('serve', help="only run the stand-in server")
+    add_site_options(serve_command)
+    serve_command.add_argument('--port', type=int, default=8765)
+
+    argv = sys.argv[1:]
+    if not argv or argv[0].startswith('-') and argv[0] not in ('-h', '--help'):
+        argv = ['run'] + argv  # "run" is the default command
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == 'serve':
+        serve(args)
+    elif args.command == 'once':
+        print(json.dumps(run_once(args)))
+    else:
+        run(args)
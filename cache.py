@@ -0,0 +1,122 @@
+import sqlite3
+import threading
+import time
+from logger import logger
+from config import HTTP_CACHE_PATH, HTTP_CACHE_TTL, HTTP_CACHE_MAX_BYTES, SQLITE_BUSY_TIMEOUT
+
+class ResponseCache:
+    """Persistent HTTP response cache keyed by URL with TTL freshness and LRU eviction.
+
+    Entries keep the body together with the ETag and Last-Modified validators so
+    stale entries can be revalidated with a conditional request instead of being
+    downloaded again.
+    """
+
+    def __init__(self, path=HTTP_CACHE_PATH, ttl=HTTP_CACHE_TTL, max_bytes=HTTP_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'bytes_saved': 0}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''CREATE TABLE IF NOT EXISTS responses (
+                                url TEXT PRIMARY KEY,
+                                body BLOB,
+                                content_type TEXT,
+                                encoding TEXT,
+                                etag TEXT,
+                                last_modified TEXT,
+                                fetched_at REAL,
+                                last_access REAL,
+                                size INTEGER
+                            )''')
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        logger.debug(f"Opened HTTP cache at {path} ({self._total_bytes} bytes)")
+
+    def lookup(self, url):
+        """Return the cached entry for a URL as a dict, or None when it is not cached."""
+        with self._lock:
+            row = self._conn.execute('''SELECT body, content_type, encoding, etag, last_modified, fetched_at, size
+                                        FROM responses WHERE url = ?''', (url,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+        body, content_type, encoding, etag, last_modified, fetched_at, size = row
+        return {
+            'body': body,
+            'content_type': content_type,
+            'encoding': encoding,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': fetched_at,
+            'size': size,
+        }
+
+    def is_fresh(self, entry):
+        """Check whether a cached entry is still within the TTL."""
+        return time.time() - entry['fetched_at'] < self.ttl
+
+    def store(self, url, body, content_type=None, encoding=None, etag=None, last_modified=None):
+        """Store or replace the cached response for a URL, evicting old entries if over the size limit."""
+        now = time.time()
+        size = len(body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            self._conn.execute('''INSERT OR REPLACE INTO responses
+                                  (url, body, content_type, encoding, etag, last_modified, fetched_at, last_access, size)
+                                  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                               (url, body, content_type, encoding, etag, last_modified, now, now, size))
+            self._total_bytes += size - (previous[0] if previous else 0)
+            self._stats['stores'] += 1
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def mark_revalidated(self, url):
+        """Restart the TTL of an entry after the server confirmed it is unchanged."""
+        with self._lock:
+            self._conn.execute("UPDATE responses SET fetched_at = ? WHERE url = ?", (time.time(), url))
+            self._conn.commit()
+
+    def record(self, outcome, saved_bytes=0):
+        """Count a cache hit, revalidation or miss and the bytes it saved."""
+        with self._lock:
+            self._stats[outcome] += 1
+            self._stats['bytes_saved'] += saved_bytes
+
+    def _evict(self):
+        # Drop least recently used entries until the cache is back under 90% of its limit
+        target = self.max_bytes * 0.9
+        while self._total_bytes > target:
+            rows = self._conn.execute("SELECT url, size FROM responses ORDER BY last_access LIMIT 100").fetchall()
+            if not rows:
+                break
+            for url, size in rows:
+                if self._total_bytes <= target:
+                    break
+                self._conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+                self._total_bytes -= size
+                self._stats['evictions'] += 1
+
+    def stats(self):
+        """Return hit/miss counters, bytes saved and the current cache size."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size_bytes'] = self._total_bytes
+        return stats
+
+    def log_stats(self):
+        stats = self.stats()
+        lookups = stats['hits'] + stats['revalidated'] + stats['misses']
+        hit_rate = (stats['hits'] + stats['revalidated']) / lookups * 100 if lookups else 0.0
+        logger.info(f"HTTP cache: {stats['hits']} hits, {stats['revalidated']} revalidated (304), {stats['misses']} misses "
+                    f"({hit_rate:.1f}% served from cache), {stats['bytes_saved']} bytes saved, "
+                    f"{stats['evictions']} evictions, {stats['size_bytes']} bytes stored")
@@ -0,0 +1,107 @@
+import sqlite3
+from datetime import datetime, timezone
+from logger import logger
+from db import get_connection
+
+# crawl_state.status values
+IN_PROGRESS = 'in_progress'
+COMPLETED = 'completed'
+
+# crawl_urls.status values
+PENDING = 'pending'
+FAILED = 'failed'
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+def start_run(name, resume=False):
+    """Return the id of a new crawl run, or with resume the id of the latest run of that name if it never finished.
+
+    Checkpoints record the run that saved them, so a resumed run skips the content
+    types and shards it already completed instead of crawling them again.
+    """
+    conn = get_connection()
+    if resume:
+        row = conn.execute("SELECT id, started_at, finished_at FROM crawl_runs WHERE name = ? ORDER BY id DESC LIMIT 1",
+                           (name,)).fetchone()
+        if row is not None and row[2] is None:
+            logger.info(f"Continuing crawl run {row[0]} started {row[1]}")
+            return row[0]
+    run_id = conn.execute("INSERT INTO crawl_runs (name, started_at) VALUES (?, ?)", (name, _now())).lastrowid
+    conn.commit()
+    return run_id
+
+def finish_run(run_id):
+    """Mark a crawl run as finished, so the next --resume starts a new one."""
+    conn = get_connection()
+    conn.execute("UPDATE crawl_runs SET finished_at = ? WHERE id = ?", (_now(), run_id))
+    conn.commit()
+
+def load_checkpoint(content_type):
+    """Return the saved crawl state for a content type as a dict, or None if there is none."""
+    try:
+        row = get_connection().execute("SELECT page, status, updated_at, run_id FROM crawl_state WHERE content_type = ?",
+                                       (content_type,)).fetchone()
+    except sqlite3.DatabaseError as e:
+        logger.error(f"Database error loading checkpoint for {content_type}: {e}")
+        return None
+    if row is None:
+        return None
+    return {'page': row[0], 'status': row[1], 'updated_at': row[2], 'run_id': row[3]}
+
+def resume_page(content_type, first_page=1, run_id=None):
+    """Return the listing page an interrupted crawl should restart from, first_page if it finished in an
+    earlier run, or None if it already finished in run run_id."""
+    state = load_checkpoint(content_type)
+    if state is not None and state['status'] == COMPLETED and run_id is not None and state['run_id'] == run_id:
+        logger.info(f"{content_type} crawl already completed in run {run_id} (saved {state['updated_at']}), skipping")
+        return None
+    if state is None or state['status'] == COMPLETED:
+        return first_page
+    pending = pending_count(content_type)
+    logger.info(f"Resuming {content_type} crawl at page {state['page']} (saved {state['updated_at']}, "
+                f"{pending} pending detail URLs)")
+    return state['page']
+
+def save_checkpoint(conn, content_type, page, status=IN_PROGRESS, run_id=None):
+    """Record the next listing page to crawl and clear pending URLs of earlier pages.
+
+    Runs on the writer's connection right after a flush, so the saved page never
+    points past rows that are not yet committed.
+    """
+    conn.execute("INSERT OR REPLACE INTO crawl_state (content_type, page, status, updated_at, run_id) VALUES (?, ?, ?, ?, ?)",
+                 (content_type, page, status, _now(), run_id))
+    conn.execute("DELETE FROM crawl_urls WHERE content_type = ? AND status = ? AND (page < ? OR ? = ?)",
+                 (content_type, PENDING, page, status, COMPLETED))
+
+def mark_pending(content_type, page, items):
+    """Record the detail URLs of a listing page that are about to be fetched."""
+    conn = get_connection()
+    now = _now()
+    conn.executemany('''INSERT OR IGNORE INTO crawl_urls (content_type, url, title, page, status, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?)''',
+                     [(content_type, item.url, item.title, page, PENDING, now) for item in items])
+    conn.commit()
+
+def pending_count(content_type):
+    return get_connection().execute("SELECT COUNT(*) FROM crawl_urls WHERE content_type = ? AND status = ?",
+                                    (content_type, PENDING)).fetchone()[0]
+
+def record_failure(content_type, url, title, error):
+    """Record a detail URL that could not be fetched so a resumed run can retry it."""
+    try:
+        conn = get_connection()
+        conn.execute('''INSERT OR REPLACE INTO crawl_urls (content_type, url, title, status, error, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?)''', (content_type, url, title, FAILED, str(error), _now()))
+        conn.commit()
+    except sqlite3.DatabaseError as e:
+        logger.error(f"Database error recording failed URL {url}: {e}")
+
+def failed_urls(content_type):
+    """Return (url, title) pairs of detail pages that failed in earlier runs."""
+    return get_connection().execute("SELECT url, title FROM crawl_urls WHERE content_type = ? AND status = ?",
+                                    (content_type, FAILED)).fetchall()
+
+def clear_failure(conn, content_type, url):
+    """Forget a failed detail URL once it has been fetched successfully."""
+    conn.execute("DELETE FROM crawl_urls WHERE content_type = ? AND url = ?", (content_type, url))
\ No newline at end of file
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 # Base directory of the project
@@ -5,17 +6,85 @@ BASE_DIR = Path(__file__).resolve().parent
 
 # Database configuration
 DATABASE_PATH = BASE_DIR / "data" / "database" / "movies_series.db"
+SQLITE_CACHE_SIZE_KB = 20000  # Page cache per connection
+SQLITE_BUSY_TIMEOUT = 30  # Seconds to wait for another process's write lock before failing
+WRITE_BATCH_SIZE = 100  # Rows buffered before a bulk insert
+WRITE_FLUSH_INTERVAL = 5.0  # Seconds before buffered rows are written regardless of batch size
+WRITER_THREAD = True  # Run inserts on a dedicated writer thread
+WRITE_RETRIES = 3  # Consecutive failed flushes of a batch before the writer gives up and the crawl stops
+
+# Logging and run report configuration
+LOG_FORMAT = "text"  # "text" for plain lines, "json" for one JSON object per line
+RUN_SUMMARY_PATH = BASE_DIR / "logs" / "run_summary.json"  # Per-stage timings, counters and errors of the last run
+PROMETHEUS_PATH = None  # Also write metrics in Prometheus text format to this path when set
+LOG_ASYNC = True  # Write log records on a background thread so scraper threads never block on the file
+LOG_MAX_BYTES = 10 * 1024 * 1024  # Size at which the log file is rotated
+LOG_BACKUP_COUNT = 5  # Rotated log files kept
 
 # Directory paths
 DIRECTORIES = [
     BASE_DIR / "data" / "database",
     BASE_DIR / "data" / "images" / "movies",
     BASE_DIR / "data" / "images" / "series",
+    BASE_DIR / "data" / "cache",
     BASE_DIR / "logs",
 ]
 
 # Scraper configuration
-BASE_URL = "https://uflix.to"
+BASE_URL = os.environ.get("SCRAPER_BASE_URL", "https://uflix.to")  # Override to scrape a mirror or the benchmark server
 REQUEST_TIMEOUT = 10
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-SLEEP_INTERVAL = 1  # Seconds between page requests
\ No newline at end of file
+HTML_PARSER = "auto"  # "auto" uses lxml when installed, otherwise "html.parser"
+SCOPED_PARSING = True  # Only build the parts of each page the scrapers read
+SCRAPE_MODE = "full"  # "incremental" stops after pages of already-known titles, "full" walks every page, "refresh" also re-checks stale titles
+REFRESH_AFTER_DAYS = 7  # In refresh mode, re-fetch details of titles last checked longer ago than this
+INCREMENTAL_STOP_PAGES = 2  # Consecutive fully-known listing pages before an incremental scrape stops
+MAX_LISTING_PAGES = 10000  # Upper bound when probing for the last listing page to plan shards
+KNOWN_TITLE_INDEX = "auto"  # Known-title lookups: "set", "bloom" (Bloom filter, database confirms hits), "off" (query per page) or "auto"
+KNOWN_INDEX_SET_MAX = 1000000  # In "auto" mode, tables with more rows than this are checked with queries instead of a set
+BLOOM_ERROR_RATE = 0.01  # Target false positive rate of the Bloom filter index
+LISTING_PREFETCH = 2  # Listing pages fetched and parsed ahead of the one being processed; 0 fetches each in turn
+POOL_CONNECTIONS = 10  # Number of per-host connection pools kept by the shared session
+POOL_MAXSIZE = 16  # Keep-alive connections kept per host pool
+
+# Rate limiting and retry configuration (applies to every request, per host)
+RATE_LIMIT = 2.0  # Starting requests per second
+RATE_LIMIT_MIN = 0.2  # Floor the rate drops to under repeated throttling
+RATE_LIMIT_MAX = 8.0  # Ceiling the rate recovers towards while requests succeed
+RATE_LIMIT_BURST = 4  # Requests that may be sent back to back after an idle period
+MAX_RETRIES = 3  # Retries for connection errors, timeouts, 429 and 5xx responses
+BACKOFF_BASE = 1.0  # Seconds; retry n waits a random time up to BACKOFF_BASE * 2**n
+BACKOFF_MAX = 60.0  # Upper bound on a single backoff delay in seconds
+CIRCUIT_BREAKER_THRESHOLD = 10  # Consecutive failures before requests to a host are suspended
+CIRCUIT_BREAKER_COOLDOWN = 120  # Seconds before a suspended host is probed again
+
+# HTTP response cache configuration (detail pages and posters)
+HTTP_CACHE_ENABLED = True
+HTTP_CACHE_PATH = BASE_DIR / "data" / "cache" / "http_cache.db"
+HTTP_CACHE_TTL = 24 * 60 * 60  # Seconds a cached response is used without revalidation
+HTTP_CACHE_MAX_BYTES = 512 * 1024 * 1024  # Least recently used entries are evicted beyond this size
+
+# Poster store configuration
+POSTER_CHUNK_SIZE = 64 * 1024  # Bytes per streamed read and write buffer size
+
+# Background poster pipeline configuration
+IMAGE_PIPELINE = True  # Download posters on a separate worker pool instead of inside the scrape loop
+IMAGE_WORKERS = 4  # Concurrent poster downloads
+IMAGE_QUEUE_SIZE = 500  # Posters that may wait for download before scrapers block
+
+# Poster derivative configuration (requires Pillow)
+DERIVATIVES_ENABLED = True  # Create thumbnails and WebP copies of stored posters after scraping
+THUMBNAIL_SIZE = (200, 300)  # Maximum thumbnail width and height in pixels, aspect ratio is kept
+THUMBNAIL_QUALITY = 85  # JPEG quality of thumbnails (0-100)
+WEBP_QUALITY = 80  # Quality of the full-size WebP copies (0-100)
+DERIVATIVE_WORKERS = None  # Processes used for image work; None uses every CPU core
+
+# Export configuration
+EXPORT_DIR = BASE_DIR / "data" / "exports"  # Default destination of export.py
+EXPORT_CHUNK_SIZE = 5000  # Rows fetched from the database and written per chunk (one Parquet row group)
+EXPORT_SETTLE_SECONDS = 60  # Incremental exports leave out rows changed this recently, which may not be committed yet
+
+# Concurrency configuration
+CONCURRENT_SCRAPING = False  # Fetch detail pages and posters of a listing page in parallel
+MAX_WORKERS = 8  # Worker threads used when concurrent scraping is enabled
+MAX_CONNECTIONS_PER_HOST = 4  # Simultaneous requests allowed against a single host
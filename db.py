@@ -1,110 +1,157 @@
+import argparse
 import sqlite3
+import threading
 from pathlib import Path
 from logger import logger
-from config import DATABASE_PATH
+import metrics
+from normalize import ensure_schema
+from config import DATABASE_PATH, SQLITE_CACHE_SIZE_KB, SQLITE_BUSY_TIMEOUT
 
-def check_db():
-    """Check if the database exists and has the correct schema for movies and series tables."""
-    db_path = DATABASE_PATH
-    required_columns = {
-        'movies': [
-            ('id', 'INTEGER PRIMARY KEY AUTOINCREMENT'),
-            ('title', 'TEXT'),
-            ('image', 'TEXT'),
-            ('year', 'TEXT'),
-            ('imdb', 'TEXT'),
-            ('release_date', 'TEXT'),
-            ('description', 'TEXT'),
-            ('country', 'TEXT'),
-            ('category', 'TEXT'),
-            ('trailer_link', 'TEXT')
-        ],
-        'series': [
-            ('id', 'INTEGER PRIMARY KEY AUTOINCREMENT'),
-            ('title', 'TEXT'),
-            ('image', 'TEXT'),
-            ('year', 'TEXT'),
-            ('imdb', 'TEXT'),
-            ('release_date', 'TEXT'),
-            ('description', 'TEXT'),
-            ('country', 'TEXT'),
-            ('category', 'TEXT'),
-            ('trailer_link', 'TEXT')
-        ]
-    }
-
-    logger.info(f"Checking database at {db_path}")
-    
-    # Check if database file exists
-    if not db_path.exists():
-        logger.warning(f"Database {db_path} does not exist")
-        init_db()
-        return True
+# Tables holding the scraped movies and series
+CONTENT_TABLES = ('movies', 'series')
 
-    try:
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        
-        # Check if tables exist and migrate if necessary
-        for table in ['movies', 'series']:
-            c.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table}'")
-            if not c.fetchone():
-                logger.warning(f"{table} table does not exist")
-                init_db()
-                conn.close()
-                return True
-
-            # Check columns
-            c.execute(f"PRAGMA table_info({table})")
-            existing_columns = {(row[1], row[2]) for row in c.fetchall()}
-            required_columns_set = {(name, type_) for name, type_ in required_columns[table]}
-            
-            if existing_columns != required_columns_set:
-                logger.warning(f"{table} table schema mismatch. Expected: {required_columns_set}, Found: {existing_columns}")
-                # Check if only trailer_link is missing
-                missing_columns = required_columns_set - existing_columns
-                if missing_columns == {('trailer_link', 'TEXT')}:
-                    logger.info(f"Adding trailer_link column to {table} table")
-                    c.execute(f"ALTER TABLE {table} ADD COLUMN trailer_link TEXT")
-                    conn.commit()
-                    logger.info(f"Successfully added trailer_link to {table}")
-                else:
-                    logger.error(f"Schema mismatch beyond trailer_link. Reinitializing database.")
-                    init_db()
-                    conn.close()
-                    return True
+# SQLite caps the number of bound parameters per statement on older builds
+MAX_QUERY_PARAMS = 900
+
+# Content tables covered by the full-text index, with the label search results carry
+SEARCH_TABLES = {'movies': 'movie', 'series': 'series'}
+
+# bm25() column weights of the full-text index: a title match outranks a description match
+SEARCH_WEIGHTS = (10.0, 1.0)
+
+# SQL for the current UTC time, in the format of the timestamps written from Python
+SQL_NOW = "strftime('%Y-%m-%dT%H:%M:%S+00:00', 'now')"
+
+_local = threading.local()
+
+def get_connection():
+    """Return this thread's long-lived database connection, opening it on first use."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DATABASE_PATH, timeout=SQLITE_BUSY_TIMEOUT)
+        apply_pragmas(conn)
+        _local.conn = conn
+        logger.debug(f"Opened database connection to {DATABASE_PATH}")
+    return conn
 
+def apply_pragmas(conn):
+    """Apply per-connection performance settings; WAL makes NORMAL sync safe against corruption."""
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+
+def close_connection():
+    """Close this thread's long-lived database connection if it is open."""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
         conn.close()
-        logger.info("Database and tables schema verified successfully")
+        _local.conn = None
+        logger.debug("Database connection closed")
+
+def ensure_title_index(c, table):
+    """Create the unique title index on a table, dropping duplicate titles first if needed."""
+    c.execute("SELECT 1 FROM sqlite_master WHERE type='index' AND name=?", (f"idx_{table}_title",))
+    if c.fetchone():
+        return
+    c.execute(f"DELETE FROM {table} WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY title)")
+    if c.rowcount > 0:
+        logger.warning(f"Removed {c.rowcount} duplicate titles from {table}")
+    c.execute(f"CREATE UNIQUE INDEX idx_{table}_title ON {table} (title)")
+    logger.info(f"Created unique title index on {table}")
+
+def ensure_search_index(c, table):
+    """Create the FTS5 index over a table's title and description, with the triggers that keep it in sync.
+
+    The index stores no text of its own (content=table); when it is first created it is
+    built from the existing rows. Returns False if this SQLite build lacks FTS5.
+    """
+    c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (f"{table}_fts",))
+    if c.fetchone():
         return True
-    except sqlite3.DatabaseError as e:
-        logger.error(f"Database error checking {db_path}: {e}")
-        conn.close()
-        return False
-    except Exception as e:
-        logger.error(f"Unexpected error checking database: {e}")
-        conn.close()
+    try:
+        c.execute(f"""CREATE VIRTUAL TABLE {table}_fts USING fts5(
+                        title, description, content='{table}', content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""")
+    except sqlite3.OperationalError as e:
+        logger.warning(f"Full-text search unavailable for {table}: {e}")
         return False
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_fts_insert AFTER INSERT ON {table} BEGIN
+                    INSERT INTO {table}_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+                  END""")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_fts_delete AFTER DELETE ON {table} BEGIN
+                    INSERT INTO {table}_fts ({table}_fts, rowid, title, description)
+                    VALUES ('delete', old.id, old.title, old.description);
+                  END""")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS {table}_fts_update AFTER UPDATE OF title, description ON {table} BEGIN
+                    INSERT INTO {table}_fts ({table}_fts, rowid, title, description)
+                    VALUES ('delete', old.id, old.title, old.description);
+                    INSERT INTO {table}_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+                  END""")
+    c.execute(f"INSERT INTO {table}_fts ({table}_fts) VALUES ('rebuild')")
+    logger.info(f"Created full-text search index on {table}")
+    return True
 
 def exists_in_table(table, title):
     """Check if an item with the given title exists in the specified table."""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        c = conn.cursor()
+        c = get_connection().cursor()
         c.execute(f"SELECT 1 FROM {table} WHERE title = ?", (title,))
         exists = c.fetchone() is not None
-        conn.close()
-        logger.debug(f"Checked {table} existence: {title} {'exists' if exists else 'does not exist'}")
+        logger.debug("Checked %s existence: %s %s", table, title, 'exists' if exists else 'does not exist')
         return exists
     except sqlite3.DatabaseError as e:
         logger.error(f"Database error checking {table} existence for {title}: {e}")
-        conn.close()
         return False
     except Exception as e:
         logger.error(f"Unexpected error checking {table} existence for {title}: {e}")
-        conn.close()
         return False
 
+def existing_titles(table, titles):
+    """Return the subset of the given titles that already exist in the specified table."""
+    titles = list(dict.fromkeys(t for t in titles if t))
+    found = set()
+    try:
+        with metrics.timer('exists_check'):
+            c = get_connection().cursor()
+            for start in range(0, len(titles), MAX_QUERY_PARAMS):
+                chunk = titles[start:start + MAX_QUERY_PARAMS]
+                placeholders = ', '.join('?' * len(chunk))
+                c.execute(f"SELECT title FROM {table} WHERE title IN ({placeholders})", chunk)
+                found.update(row[0] for row in c.fetchall())
+        logger.debug("Checked %d titles against %s: %d exist", len(titles), table, len(found))
+        return found
+    except sqlite3.DatabaseError as e:
+        logger.error(f"Database error checking {table} existence for {len(titles)} titles: {e}")
+        metrics.record_error('exists_check', 'database')
+        return found
+    except Exception as e:
+        logger.error(f"Unexpected error checking {table} existence for {len(titles)} titles: {e}")
+        metrics.record_error('exists_check', 'unexpected')
+        return found
+
+def stale_titles(table, titles, stale_before):
+    """Return {title: content_hash} for the given titles whose details were last checked before stale_before (or never)."""
+    titles = list(dict.fromkeys(t for t in titles if t))
+    stale = {}
+    try:
+        with metrics.timer('exists_check'):
+            c = get_connection().cursor()
+            for start in range(0, len(titles), MAX_QUERY_PARAMS):
+                chunk = titles[start:start + MAX_QUERY_PARAMS]
+                placeholders = ', '.join('?' * len(chunk))
+                c.execute(f"""SELECT title, content_hash FROM {table}
+                              WHERE title IN ({placeholders}) AND (last_seen IS NULL OR last_seen < ?)""",
+                          (*chunk, stale_before))
+                stale.update(c.fetchall())
+        return stale
+    except sqlite3.DatabaseError as e:
+        logger.error(f"Database error checking {table} staleness for {len(titles)} titles: {e}")
+        metrics.record_error('exists_check', 'database')
+        return stale
+
+def mark_seen(conn, table, titles, seen_at):
+    """Record that the details of the given titles were re-checked and found unchanged."""
+    conn.executemany(f"UPDATE {table} SET last_seen = ? WHERE title = ?", [(seen_at, title) for title in titles])
+
 def movie_exists(title):
     """Check if a movie with the given title exists in the movies table."""
     return exists_in_table('movies', title)
@@ -113,19 +160,28 @@ def series_exists(title):
     """Check if a series with the given title exists in the series table."""
     return exists_in_table('series', title)
 
-def init_db():
-    """Initialize the database with movies and series tables."""
-    db_path = DATABASE_PATH
-    logger.info(f"Initializing database at {db_path}")
-    try:
-        # Ensure parent directory exists
-        db_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        conn = sqlite3.connect(db_path)
-        c = conn.cursor()
-        
-        logger.debug("Creating 'movies' table if not exists")
-        c.execute('''CREATE TABLE IF NOT EXISTS movies (
+def existing_movies(titles):
+    """Return the movie titles from the given list that already exist in the movies table."""
+    return existing_titles('movies', titles)
+
+def existing_series(titles):
+    """Return the series titles from the given list that already exist in the series table."""
+    return existing_titles('series', titles)
+
+def _add_columns(c, columns):
+    """Add the given {name: type} columns to both content tables where they are missing."""
+    for table in CONTENT_TABLES:
+        c.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in c.fetchall()}
+        for name, type_ in columns.items():
+            if name not in existing:
+                logger.info(f"Adding {name} column to {table} table")
+                c.execute(f"ALTER TABLE {table} ADD COLUMN {name} {type_}")
+
+def _create_content_tables(c):
+    for table in CONTENT_TABLES:
+        logger.debug(f"Creating '{table}' table if not exists")
+        c.execute(f'''CREATE TABLE IF NOT EXISTS {table} (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         title TEXT,
                         image TEXT,
@@ -134,32 +190,225 @@ def init_db():
                         release_date TEXT,
                         description TEXT,
                         country TEXT,
-                        category TEXT,
-                        trailer_link TEXT
+                        category TEXT
                     )''')
+
+def _add_trailer_link(c):
+    _add_columns(c, {'trailer_link': 'TEXT'})
+
+def _add_title_indexes(c):
+    for table in CONTENT_TABLES:
+        ensure_title_index(c, table)
+
+def _create_posters_table(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS posters (
+                    url TEXT PRIMARY KEY,
+                    sha256 TEXT,
+                    path TEXT,
+                    size INTEGER,
+                    fetched_at TEXT
+                )''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_posters_sha256 ON posters (sha256)")
+
+def _create_checkpoint_tables(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS crawl_state (
+                    content_type TEXT PRIMARY KEY,
+                    page INTEGER,
+                    status TEXT,
+                    updated_at TEXT
+                )''')
+    c.execute('''CREATE TABLE IF NOT EXISTS crawl_urls (
+                    content_type TEXT,
+                    url TEXT,
+                    title TEXT,
+                    page INTEGER,
+                    status TEXT,
+                    error TEXT,
+                    updated_at TEXT,
+                    PRIMARY KEY (content_type, url)
+                )''')
+
+def _add_image_columns(c):
+    _add_columns(c, {'image_url': 'TEXT', 'image_thumb': 'TEXT', 'image_webp': 'TEXT'})
+
+def _add_change_tracking_columns(c):
+    _add_columns(c, {'content_hash': 'TEXT', 'last_seen': 'TEXT', 'updated_at': 'TEXT'})
+
+def _add_search_indexes(c):
+    for table in CONTENT_TABLES:
+        ensure_search_index(c, table)
+
+def _create_export_state_table(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS export_state (
+                    name TEXT PRIMARY KEY,
+                    watermark TEXT,
+                    rows INTEGER,
+                    exported_at TEXT
+                )''')
+
+def _create_crawl_runs_table(c):
+    c.execute('''CREATE TABLE IF NOT EXISTS crawl_runs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT,
+                    started_at TEXT,
+                    finished_at TEXT
+                )''')
+    c.execute("PRAGMA table_info(crawl_state)")
+    if 'run_id' not in {row[1] for row in c.fetchall()}:
+        c.execute("ALTER TABLE crawl_state ADD COLUMN run_id INTEGER")
+
+def _add_modified_at(c):
+    # Unlike updated_at (content changed), modified_at moves on any write to a row, posters included
+    _add_columns(c, {'modified_at': 'TEXT'})
+    for table in CONTENT_TABLES:
+        c.execute(f"UPDATE {table} SET modified_at = updated_at WHERE modified_at IS NULL")
+
+def _add_modified_at_indexes(c):
+    for table in CONTENT_TABLES:
+        # Replaces the updated_at index earlier versions of export.py created on first use
+        c.execute(f"DROP INDEX IF EXISTS idx_{table}_updated_at")
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_modified_at ON {table} (modified_at)")
+
+# Schema migrations in order; PRAGMA user_version records the last one applied.
+# Each must be idempotent, since databases from before versioning start at 0.
+MIGRATIONS = [
+    (1, "movies and series tables", _create_content_tables),
+    (2, "trailer_link column", _add_trailer_link),
+    (3, "unique title indexes", _add_title_indexes),
+    (4, "posters table", _create_posters_table),
+    (5, "crawl checkpoint tables", _create_checkpoint_tables),
+    (6, "poster URL and derivative columns", _add_image_columns),
+    (7, "content hash and change timestamps", _add_change_tracking_columns),
+    (8, "typed columns and category/country tables", ensure_schema),
+    (9, "full-text search indexes", _add_search_indexes),
+    (10, "export watermarks table", _create_export_state_table),
+    (11, "crawl runs table", _create_crawl_runs_table),
+    (12, "row modification timestamps", _add_modified_at),
+    (13, "modification timestamp indexes for incremental exports", _add_modified_at_indexes),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def init_db():
+    """Create the database if needed and apply the migrations it has not had yet."""
+    db_path = DATABASE_PATH
+    conn = None
+    try:
+        # Ensure parent directory exists
+        db_path.parent.mkdir(parents=True, exist_ok=True)
         
-        logger.debug("Creating 'series' table if not exists")
-        c.execute('''CREATE TABLE IF NOT EXISTS series (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        title TEXT,
-                        image TEXT,
-                        year TEXT,
-                        imdb TEXT,
-                        release_date TEXT,
-                        description TEXT,
-                        country TEXT,
-                        category TEXT,
-                        trailer_link TEXT
-                    )''')
+        conn = sqlite3.connect(db_path, timeout=SQLITE_BUSY_TIMEOUT)
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            if version > SCHEMA_VERSION:
+                logger.warning(f"Database schema version {version} is newer than this code's {SCHEMA_VERSION}")
+            logger.debug(f"Database schema is up to date (version {version})")
+            return
+        
+        logger.info(f"Initializing database at {db_path}")
+        # WAL lets the writer thread commit while scrapers keep reading
+        journal_mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        logger.debug(f"Database journal mode: {journal_mode}")
+        apply_pragmas(conn)
         
+        c = conn.cursor()
+        # Take the write lock before re-reading the version, so concurrent runs migrate only once
+        c.execute("BEGIN IMMEDIATE")
+        version = c.execute("PRAGMA user_version").fetchone()[0]
+        for number, description, migrate in MIGRATIONS:
+            if number > version:
+                logger.info(f"Applying schema migration {number}: {description}")
+                migrate(c)
+                version = number
+        c.execute(f"PRAGMA user_version = {version}")
         conn.commit()
-        logger.info("Database initialized successfully")
+        logger.info(f"Database initialized successfully (schema version {version})")
     except sqlite3.DatabaseError as e:
         logger.error(f"Failed to initialize database: {e}")
+        if conn is not None:
+            conn.rollback()
         raise
     except Exception as e:
         logger.error(f"Unexpected error initializing database: {e}")
+        if conn is not None:
+            conn.rollback()
         raise
     finally:
-        conn.close()
-        logger.debug("Database connection closed")
\ No newline at end of file
+        if conn is not None:
+            conn.close()
+            logger.debug("Database connection closed")
+
+def check_db():
+    """Check that the database exists and is at the current schema version, migrating it if not."""
+    if not DATABASE_PATH.exists():
+        logger.warning(f"Database {DATABASE_PATH} does not exist")
+        init_db()
+        return True
+    try:
+        version = get_connection().execute("PRAGMA user_version").fetchone()[0]
+    except sqlite3.DatabaseError as e:
+        logger.error(f"Database error checking {DATABASE_PATH}: {e}")
+        return False
+    if version < SCHEMA_VERSION:
+        logger.warning(f"Database schema version {version} is older than {SCHEMA_VERSION}, migrating")
+        try:
+            init_db()
+        except Exception:
+            return False
+    logger.debug(f"Database schema verified (version {version})")
+    return True
+
+def match_query(text):
+    """Turn free-text keywords into an FTS5 query matching rows that contain every word.
+
+    A word ending in * matches as a prefix; prefixes match many more rows, so they
+    are opt-in rather than applied to every word.
+    """
+    terms = []
+    for word in text.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*')
+        if word:
+            terms.append('"' + word.replace('"', '""') + '"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+def search(text, limit=20, tables=tuple(SEARCH_TABLES)):
+    """Return up to limit movies and series matching the keywords, best first.
+
+    Each result is a dict with type, title, year, imdb, score (lower is better) and a
+    snippet of the description with the matched words in [brackets].
+    """
+    query = match_query(text)
+    if not query:
+        return []
+    selects = []
+    params = []
+    for table in tables:
+        selects.append(f"""SELECT '{SEARCH_TABLES[table]}' AS type, t.title, t.year, t.imdb,
+                                  bm25({table}_fts, {', '.join(map(str, SEARCH_WEIGHTS))}) AS score,
+                                  snippet({table}_fts, 1, '[', ']', '...', 12) AS snippet
+                           FROM {table}_fts JOIN {table} t ON t.id = {table}_fts.rowid
+                           WHERE {table}_fts MATCH ?""")
+        params.append(query)
+    sql = ' UNION ALL '.join(selects) + " ORDER BY score LIMIT ?"
+    try:
+        with metrics.timer('search'):
+            c = get_connection().execute(sql, (*params, limit))
+            columns = [column[0] for column in c.description]
+            results = [dict(zip(columns, row)) for row in c.fetchall()]
+        logger.debug("Search %r returned %d results", text, len(results))
+        return results
+    except sqlite3.DatabaseError as e:
+        logger.error(f"Database error searching for {text!r}: {e}")
+        return []
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search the scraped movies and series by title and description.")
+    parser.add_argument('keywords', nargs='+', help="words every result must contain; end a word with * to match it as a prefix")
+    parser.add_argument('--type', choices=sorted(SEARCH_TABLES), help="only search movies or series")
+    parser.add_argument('--limit', type=int, default=20, help="maximum number of results (default: 20)")
+    args = parser.parse_args()
+    for result in search(' '.join(args.keywords), args.limit, (args.type,) if args.type else tuple(SEARCH_TABLES)):
+        print(f"[{result['type']}] {result['title']} ({result['year'] or '?'}, IMDb {result['imdb'] or '?'})")
+        if result['snippet']:
+            print(f"    {result['snippet']}")
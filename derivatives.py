@@ -0,0 +1,93 @@
+import multiprocessing
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from logger import logger
+from db import SQL_NOW, get_connection
+from config import DERIVATIVES_ENABLED, THUMBNAIL_SIZE, THUMBNAIL_QUALITY, WEBP_QUALITY, DERIVATIVE_WORKERS
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+def derivative_paths(image_path):
+    """Return the thumbnail and WebP paths derived from a stored poster path."""
+    stem = os.path.splitext(image_path)[0]
+    return f"{stem}.thumb.jpg", f"{stem}.webp"
+
+def make_derivatives(image_path):
+    """Write the thumbnail and WebP copy of a poster, skipping files that already exist.
+
+    Runs in a worker process, so it only touches the filesystem.
+    """
+    thumb_path, webp_path = derivative_paths(image_path)
+    if os.path.exists(thumb_path) and os.path.exists(webp_path):
+        return thumb_path, webp_path
+
+    with Image.open(image_path) as image:
+        image = image.convert('RGB')
+        if not os.path.exists(webp_path):
+            _save(image, webp_path, 'WEBP', quality=WEBP_QUALITY, method=4)
+        if not os.path.exists(thumb_path):
+            image.thumbnail(THUMBNAIL_SIZE)
+            _save(image, thumb_path, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+    return thumb_path, webp_path
+
+def _save(image, path, fmt, **options):
+    # Write to a temporary name first so an interrupted run never leaves a truncated derivative
+    tmp_path = f"{path}.part"
+    try:
+        image.save(tmp_path, fmt, **options)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def pending_posters(table):
+    """Return the stored poster paths in a table that still lack a thumbnail or WebP copy."""
+    rows = get_connection().execute(f'''SELECT DISTINCT image FROM {table}
+                                        WHERE image IS NOT NULL AND (image_thumb IS NULL OR image_webp IS NULL)''')
+    return [row[0] for row in rows]
+
+def process_derivatives(specs, workers=DERIVATIVE_WORKERS):
+    """Create missing thumbnails and WebP copies for every content type in a process pool and record their paths."""
+    if not DERIVATIVES_ENABLED:
+        return
+    if Image is None:
+        logger.warning("Pillow is not installed, skipping thumbnail and WebP generation")
+        return
+
+    conn = get_connection()
+    for spec in specs:
+        try:
+            images = [path for path in pending_posters(spec.table) if os.path.exists(path)]
+        except sqlite3.DatabaseError as e:
+            logger.error(f"Database error reading {spec.noun} posters without derivatives: {e}")
+            continue
+        if not images:
+            continue
+
+        logger.info(f"Creating derivatives for {len(images)} {spec.noun} posters")
+        updates = []
+        failed = 0
+        # Spawned workers do not inherit the writer thread or the open SQLite connection
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {executor.submit(make_derivatives, path): path for path in images}
+            for future in as_completed(futures):
+                try:
+                    thumb_path, webp_path = future.result()
+                    updates.append((thumb_path, webp_path, futures[future]))
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Error creating derivatives for {futures[future]}: {e}")
+
+        try:
+            conn.executemany(f"UPDATE {spec.table} SET image_thumb = ?, image_webp = ?, modified_at = {SQL_NOW} WHERE image = ?",
+                             updates)
+            conn.commit()
+        except sqlite3.DatabaseError as e:
+            conn.rollback()
+            logger.error(f"Database error recording {spec.noun} poster derivatives: {e}")
+            continue
+        logger.info(f"Created derivatives for {len(updates)} {spec.noun} posters ({failed} failed)")
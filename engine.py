@@ -0,0 +1,417 @@
+import hashlib
+import json
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache, partial
+from logger import logger
+from db import SQL_NOW, check_db, existing_titles, mark_seen, stale_titles
+from writer import BatchWriter, ROW_COLUMNS
+from normalize import normalize_titles
+from utils import Prefetcher, download_image, map_in_order
+from image_pipeline import get_pipeline
+from title_index import get_index
+from parsing import parse_details, parse_listing, release
+import checkpoint
+import metrics
+import fetcher
+from config import (BASE_URL, SCRAPE_MODE, INCREMENTAL_STOP_PAGES, MAX_LISTING_PAGES, REFRESH_AFTER_DAYS,
+                    LISTING_PREFETCH)
+
+# How to extract one value from a node:
+#   selector  CSS selector relative to the node (None means the node itself)
+#   attr      attribute to read instead of the stripped text
+#   index     position among all matches, or a tuple of positions tried in order
+#   min_count minimum number of matches required for an indexed lookup
+#   many      join the text of every non-empty match with ", "
+#   scope     CSS selector of the first element to search within
+Field = namedtuple('Field', ['selector', 'attr', 'index', 'min_count', 'many', 'scope'],
+                   defaults=(None, None, 0, False, None))
+
+# Describes one content type on the site and where its rows are stored
+ContentSpec = namedtuple('ContentSpec', ['name', 'noun', 'table', 'listing_path', 'card_selector',
+                                         'card_fields', 'detail_fields', 'save_dir'])
+
+# A fetched listing page: its extracted cards, how many card nodes it had, whether it links to the next page, or why it failed
+ListingPage = namedtuple('ListingPage', ['page', 'url', 'cards', 'found', 'has_next', 'error'])
+
+# Query string shared by the movies and series listings
+LISTING_QUERY = "?genre=&release=1950;2025&rating=5;10&sorting=newest&language=&page={page}"
+
+# Fields read from a listing card; title and url are required
+CARD_FIELDS = {
+    'title': Field('h3.title'),
+    'image_url': Field('img', attr='src'),
+    'imdb': Field('div.card-imdb span'),
+    'year': Field('li', scope='ul.list-inline', index=(1, 0)),
+    'url': Field(None, attr='href'),
+}
+
+def extract_field(node, field):
+    """Extract a single value from a parsed node according to a Field."""
+    if field.scope:
+        node = node.select_one(field.scope)
+        if node is None:
+            return None
+
+    if field.many:
+        values = [elem.text.strip() for elem in node.select(field.selector)]
+        values = [value for value in values if value]
+        return ', '.join(values) if values else None
+
+    if field.selector is None:
+        elem = node
+    elif field.index is None:
+        elem = node.select_one(field.selector)
+    else:
+        matches = node.select(field.selector)
+        indexes = field.index if isinstance(field.index, tuple) else (field.index,)
+        elem = None
+        if len(matches) >= field.min_count:
+            for index in indexes:
+                if index < len(matches):
+                    elem = matches[index]
+                    break
+
+    if elem is None:
+        return None
+    if field.attr:
+        return elem[field.attr] if field.attr in elem.attrs else None
+    return elem.text.strip()
+
+def extract_fields(node, fields):
+    """Extract every Field in a mapping into a dict of the same keys."""
+    return {name: extract_field(node, field) for name, field in fields.items()}
+
+@lru_cache(maxsize=None)
+def record_type(names):
+    """Return the named tuple class holding one card's fields, so cards carry no per-record dict."""
+    return namedtuple('Card', names)
+
+def scrape_details(spec, detail_url, title=None):
+    """Fetch a details page and return its detail fields as a dict, or None on failure.
+
+    Failures are recorded in the crawl checkpoint so a resumed run can retry them.
+    """
+    try:
+        response = fetcher.get(f"{BASE_URL}{detail_url}", cache=True)
+        if response.status_code != 200:
+            logger.error(f"Failed to fetch details page {detail_url}: Status {response.status_code}")
+            metrics.record_error('details', f"http_{response.status_code}")
+            checkpoint.record_failure(spec.name, detail_url, title, f"Status {response.status_code}")
+            return None
+
+        soup = parse_details(response.content, response.encoding)
+        try:
+            return extract_fields(soup, spec.detail_fields)
+        finally:
+            release(soup)
+    except Exception as e:
+        logger.error(f"Error scraping details for {detail_url}: {e}")
+        metrics.record_error('details', type(e).__name__)
+        checkpoint.record_failure(spec.name, detail_url, title, e)
+        return None
+
+# Scraped columns that make up a row's content hash
+HASHED_COLUMNS = ('title', 'year', 'imdb', 'release_date', 'description', 'country', 'category', 'trailer_link', 'image_url')
+HASH_INDEX = ROW_COLUMNS.index('content_hash')
+
+def content_hash(record):
+    """Hash the scraped fields of a row so unchanged titles can be recognised on refresh."""
+    values = [record.get(column) for column in HASHED_COLUMNS]
+    return hashlib.sha256(json.dumps(values, ensure_ascii=False).encode()).hexdigest()
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+def fetch_card(spec, item, download=True):
+    """Fetch the details page for a card and return the row to insert; the poster is fetched too when download is set.
+
+    When the details page could not be fetched the row's content_hash and last_seen
+    are None, so the next refresh treats the title as stale and fetches it again.
+    """
+    try:
+        record = item._asdict()
+        details = scrape_details(spec, item.url, item.title)
+        record.update(details or {})
+        if download and item.image_url:
+            record['image'] = download_image(item.image_url, item.title, spec.save_dir)
+        now = _now()
+        record['content_hash'] = content_hash(record) if details is not None else None
+        record['last_seen'] = now if details is not None else None
+        record['updated_at'] = now
+        return tuple(record.get(column) for column in ROW_COLUMNS)
+    except Exception as e:
+        logger.error(f"Error processing {spec.noun} card: {e}")
+        return None
+
+def extract_cards(spec, soup):
+    """Extract the card fields of every card on a listing page as compact records, skipping unusable cards."""
+    card_type = record_type(tuple(spec.card_fields))
+    candidates = []
+    for card in soup.select(spec.card_selector):
+        try:
+            item = extract_fields(card, spec.card_fields)
+            if not item['title']:
+                logger.warning(f"Skipping {spec.noun} card with no title")
+                continue
+            if not item['url']:
+                logger.error(f"Skipping {spec.noun} card with no detail link: {item['title']}")
+                continue
+            candidates.append(card_type(**item))
+        except Exception as e:
+            logger.error(f"Error processing {spec.noun} card: {e}")
+    return candidates
+
+def _update_details(spec, title, url, details, conn):
+    """Fill a stored row with recovered details, refreshing its content hash and change timestamps."""
+    stored = conn.execute(f"SELECT {', '.join(HASHED_COLUMNS)} FROM {spec.table} WHERE title = ?", (title,)).fetchone()
+    record = dict(zip(HASHED_COLUMNS, stored or ()))
+    record.update(details)
+    now = _now()
+    updates = {**details, 'content_hash': content_hash(record), 'last_seen': now, 'updated_at': now}
+    columns = ', '.join(f"{column} = ?" for column in updates)
+    conn.execute(f"UPDATE {spec.table} SET {columns}, modified_at = {SQL_NOW} WHERE title = ?", (*updates.values(), title))
+    normalize_titles(conn, spec.table, [title])
+    checkpoint.clear_failure(conn, spec.name, url)
+
+def retry_failed(spec, writer):
+    """Re-fetch details pages that failed in earlier runs and fill in the stored rows."""
+    failed = checkpoint.failed_urls(spec.name)
+    if not failed:
+        return
+    logger.info(f"Retrying {len(failed)} failed {spec.noun} details pages")
+    for url, title in failed:
+        details = scrape_details(spec, url, title)
+        if details is not None and title:
+            writer.after_flush(partial(_update_details, spec, title, url, details))
+            logger.info(f"Recovered details for {spec.noun}: {title}")
+
+def listing_url(spec, page):
+    return f"{BASE_URL}{spec.listing_path}{LISTING_QUERY.format(page=page)}"
+
+def read_listing(spec, page, response):
+    """Parse a listing response into (cards, card nodes found, has_next), freeing the parsed tree before returning."""
+    soup = parse_listing(response.content, response.encoding)
+    try:
+        found = len(soup.select(spec.card_selector))
+        has_next = soup.select_one(f'ul.pagination a.page-link[href*="page={page + 1}"]') is not None
+        return extract_cards(spec, soup), found, has_next
+    finally:
+        release(soup)
+
+def listing_pages(spec, page, last_page=None):
+    """Fetch listing pages from page onwards, up to the last page with cards and a next-page link.
+
+    Yields a ListingPage per page carrying only the extracted card records, so pages
+    waiting in the prefetch queue hold neither the response body nor the parsed tree.
+    A page that could not be fetched carries the error and ends the sequence.
+    """
+    while True:
+        url = listing_url(spec, page)
+        try:
+            response = fetcher.get(url)
+            if response.status_code != 200:
+                yield ListingPage(page, url, [], 0, False, f"Status {response.status_code}")
+                return
+            cards, found, has_next = read_listing(spec, page, response)
+            response = None  # Generator locals outlive the yield; don't keep the body alive while the page waits
+        except Exception as e:
+            yield ListingPage(page, url, [], 0, False, e)
+            return
+        yield ListingPage(page, url, cards, found, has_next, None)
+        if not has_next or not found or (last_page is not None and page >= last_page):
+            return
+        page += 1
+
+def _has_cards(spec, page):
+    response = fetcher.get(listing_url(spec, page))
+    if response.status_code != 200:
+        return False
+    soup = parse_listing(response.content, response.encoding)
+    try:
+        return bool(soup.select(spec.card_selector))
+    finally:
+        release(soup)
+
+def discover_last_page(spec):
+    """Return the number of the last listing page of a content type, or 0 if the listing is empty.
+
+    The highest page linked from the first page's pagination is the starting point;
+    pagination widgets often only link a window of pages, so further pages are probed
+    by doubling and then bisecting.
+    """
+    response = fetcher.get(listing_url(spec, 1))
+    if response.status_code != 200:
+        raise IOError(f"Failed to fetch {spec.name} listing: Status {response.status_code}")
+    soup = parse_listing(response.content, response.encoding)
+    try:
+        if not soup.select(spec.card_selector):
+            return 0
+        linked = [int(number) for link in soup.select('ul.pagination a.page-link[href]')
+                  for number in re.findall(r'page=(\d+)', link['href'])]
+    finally:
+        release(soup)
+    low = max(linked, default=1)  # Last page known to exist
+    high = low * 2
+    while high <= MAX_LISTING_PAGES and _has_cards(spec, high):
+        low, high = high, high * 2
+    high = min(high, MAX_LISTING_PAGES + 1)
+    while high - low > 1:
+        middle = (low + high) // 2
+        if _has_cards(spec, middle):
+            low = middle
+        else:
+            high = middle
+    logger.info(f"Discovered {low} {spec.name} listing pages")
+    return low
+
+def crawl(spec, mode=None, resume=False, pages=None, writer=None, images=True, run_id=None):
+    """Crawl the listing pages of a content type; 'incremental' mode stops once pages contain only known titles, 'full' walks every page.
+
+    'refresh' mode also walks every page and re-fetches known titles not checked for
+    REFRESH_AFTER_DAYS; their rows are only rewritten when the content hash changed.
+
+    With resume=True an interrupted crawl restarts from its last checkpointed page
+    and failed details pages are retried first. pages=(first, last) limits the crawl
+    to one shard of the listing, checkpointed separately. Rows go to writer when
+    given (the caller closes it), otherwise to a new BatchWriter; images=False leaves
+    posters for a later image pipeline drain. Checkpoints are tagged with run_id (see
+    checkpoint.start_run), and a resumed run skips what it already completed.
+
+    Returns True when the crawl reached its last page (or had already done so in
+    this run), False when it stopped early on an error.
+    """
+    mode = mode or SCRAPE_MODE
+    label = spec.noun.capitalize()
+    first_page, last_page = pages or (1, None)
+    key = spec.name if pages is None else f"{spec.name}:{first_page}-{last_page}"
+
+    # Check if database is valid before scraping
+    if not check_db():
+        logger.error("Database check failed, aborting scrape")
+        return False
+
+    page = checkpoint.resume_page(key, first_page, run_id) if resume else first_page
+    if page is None:
+        return True
+    save_checkpoint = partial(checkpoint.save_checkpoint, content_type=key, run_id=run_id)
+    stale_before = (datetime.now(timezone.utc) - timedelta(days=REFRESH_AFTER_DAYS)).isoformat(timespec='seconds')
+    known_pages = 0  # Consecutive listing pages with no new titles
+    completed = False
+    own_writer = writer is None
+    if own_writer:
+        writer = BatchWriter(spec.table)
+    pipeline = get_pipeline() if images else None
+    index = get_index(spec.table)
+    listings = listing_pages(spec, page, last_page)
+    if LISTING_PREFETCH > 0:
+        listings = Prefetcher(listings, LISTING_PREFETCH, name=f"{spec.name}-listing", stage='listing_wait')
+
+    try:
+        # Failed details pages are shared by every shard, so only the first one retries them
+        if resume and first_page == 1:
+            retry_failed(spec, writer)
+
+        for listing in listings:
+            page = listing.page
+            logger.info(f"Scraping page {page}: {listing.url}")
+            if listing.error is not None:
+                logger.error(f"Failed to fetch page {page}: {listing.error}")
+                break
+
+            try:
+                if not listing.found:
+                    logger.info(f"No more {spec.name} found, stopping pagination")
+                    writer.after_flush(partial(save_checkpoint, page=page, status=checkpoint.COMPLETED))
+                    completed = True
+                    break
+                candidates = listing.cards
+
+                # Check all titles on the page against the known-title index, or the database in one query
+                titles = [item.title for item in candidates]
+                known_titles = index.known(titles) if index else existing_titles(spec.table, titles)
+                stale = stale_titles(spec.table, known_titles, stale_before) if mode == 'refresh' else {}
+                pending = []
+                for item in candidates:
+                    if item.title in known_titles and item.title not in stale:
+                        logger.debug("%s already exists in database, skipping: %s", label, item.title)
+                        continue
+                    pending.append(item)
+                new = len(pending) - len(stale)
+                known = len(candidates) - new
+                metrics.count('pages')
+                metrics.count('cards_new', new)
+                metrics.count('cards_known', known)
+                checkpoint.mark_pending(key, page, pending)
+
+                # Fetch details (concurrently if enabled), keeping page order; posters go to the image pipeline if enabled
+                rows = map_in_order(lambda item: fetch_card(spec, item, download=images and pipeline is None), pending)
+
+                # Hand rows to the batch writer in page order; refreshed titles only if their content changed
+                queued = 0
+                unchanged = []
+                for item, row in zip(pending, rows):
+                    if row is None:
+                        continue
+                    if item.title in stale:
+                        if row[HASH_INDEX] is None:
+                            continue  # Keep the stored details when the details page failed
+                        if row[HASH_INDEX] == stale[item.title]:
+                            unchanged.append(item.title)
+                            continue
+                        metrics.count('cards_changed')
+                    writer.add(row)
+                    queued += 1
+                    if index and item.title not in known_titles:
+                        index.add(item.title)
+                    logger.debug("Queued %s for insert: %s", spec.noun, row[0])
+                    if pipeline is not None and item.image_url:
+                        pipeline.submit(spec, item.title, item.image_url)
+
+                if unchanged:
+                    writer.after_flush(partial(mark_seen, table=spec.table, titles=unchanged, seen_at=_now()))
+
+                # Track new vs. known titles to stop incremental runs early
+                total = known + new
+                ratio = known / total if total else 0.0
+                logger.info("Page %d: %d new, %d known (%.0f%% known, %d refreshed, %d unchanged), %d queued for write",
+                            page, new, known, ratio * 100, len(stale), len(unchanged), queued)
+                known_pages = known_pages + 1 if total and not new else 0
+                if mode == 'incremental' and known_pages >= INCREMENTAL_STOP_PAGES:
+                    logger.info(f"{known_pages} consecutive pages of known {spec.name}, stopping incremental scrape")
+                    writer.after_flush(partial(save_checkpoint, page=page, status=checkpoint.COMPLETED))
+                    completed = True
+                    break
+
+                if last_page is not None and page >= last_page:
+                    logger.info(f"Reached the last page of shard {key}, stopping")
+                    writer.after_flush(partial(save_checkpoint, page=page, status=checkpoint.COMPLETED))
+                    completed = True
+                    break
+
+                if not listing.has_next:
+                    logger.info("No next page found, stopping")
+                    writer.after_flush(partial(save_checkpoint, page=page, status=checkpoint.COMPLETED))
+                    completed = True
+                    break
+
+                # Checkpoint the next page once this page's rows are committed
+                writer.after_flush(partial(save_checkpoint, page=page + 1))
+
+            except Exception as e:
+                logger.error(f"Error scraping page {page}: {e}")
+                break
+    finally:
+        if isinstance(listings, Prefetcher):
+            listings.close()
+        if own_writer:
+            writer.close()
+        if index:
+            index.log_stats()
+
+    if completed and not writer.has_failed():
+        logger.info(f"{label} scraping completed")
+        return True
+    logger.warning(f"{label} scraping stopped before the last page; run with --resume to continue")
+    return False
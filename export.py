@@ -0,0 +1,177 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from logger import logger
+from db import init_db
+import metrics
+from config import DATABASE_PATH, SQLITE_BUSY_TIMEOUT, EXPORT_DIR, EXPORT_CHUNK_SIZE, EXPORT_SETTLE_SECONDS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Tables that can be exported
+EXPORT_TABLES = ('movies', 'series')
+
+class CsvSink:
+    """Write rows to a CSV file with a header line."""
+    extension = 'csv'
+
+    def __init__(self, path, columns, types):
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+class JsonlSink:
+    """Write rows as one JSON object per line."""
+    extension = 'jsonl'
+
+    def __init__(self, path, columns, types):
+        self._file = open(path, 'w', encoding='utf-8')
+        self._columns = columns
+
+    def write(self, rows):
+        self._file.writelines(json.dumps(dict(zip(self._columns, row)), ensure_ascii=False) + '\n' for row in rows)
+
+    def close(self):
+        self._file.close()
+
+class ParquetSink:
+    """Write rows to a Parquet file, one row group per chunk; requires pyarrow."""
+    extension = 'parquet'
+
+    ARROW_TYPES = {'INTEGER': 'int64', 'REAL': 'float64'}
+
+    def __init__(self, path, columns, types):
+        self._schema = pa.schema([(column, self.ARROW_TYPES.get(type_.upper(), 'string'))
+                                  for column, type_ in zip(columns, types)])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, rows):
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), self._schema)]
+        self._writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+SINKS = {sink.extension: sink for sink in (ParquetSink, CsvSink, JsonlSink)}
+
+def _timestamp(moment):
+    return moment.isoformat(timespec='seconds')
+
+def _state_name(table, fmt, out_dir):
+    return f"{table}:{fmt}:{Path(out_dir).resolve()}"
+
+def load_watermark(conn, name):
+    """Return the modified_at value the previous export under this name covered rows up to, or None."""
+    row = conn.execute("SELECT watermark FROM export_state WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+def save_watermark(conn, name, watermark, rows):
+    conn.execute("INSERT OR REPLACE INTO export_state (name, watermark, rows, exported_at) VALUES (?, ?, ?, ?)",
+                 (name, watermark, rows, _timestamp(datetime.now(timezone.utc))))
+    conn.commit()
+
+def export_table(conn, table, fmt, out_dir, since_last=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream a table into out_dir in the given format and return the number of rows written.
+
+    Rows are fetched and written chunk_size at a time, so memory use does not grow with
+    the table. With since_last, only rows written since the previous export to the
+    same directory and format (by modified_at, which poster and derivative updates
+    also move) are written, to a new timestamped file.
+    Every export records a watermark for the next incremental one; rows updated around
+    the watermark may be exported twice, so consumers should upsert by title.
+    """
+    name = _state_name(table, fmt, out_dir)
+    cutoff = _timestamp(datetime.now(timezone.utc) - timedelta(seconds=EXPORT_SETTLE_SECONDS))
+    columns, types = zip(*[(row[1], row[2]) for row in conn.execute(f"PRAGMA table_info({table})")])
+    sql = f"SELECT {', '.join(columns)} FROM {table}"
+    params = ()
+    since = load_watermark(conn, name) if since_last else None
+    if since_last:
+        if since:
+            sql += " WHERE modified_at >= ? AND modified_at < ?"
+            params = (since, cutoff)
+        else:
+            sql += " WHERE modified_at < ? OR modified_at IS NULL"
+            params = (cutoff,)
+        filename = f"{table}-changes-{cutoff.replace(':', '').replace('-', '')[:15]}.{fmt}"
+    else:
+        filename = f"{table}.{fmt}"
+    sql += " ORDER BY id"
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / filename
+    # Write to a temporary name first so consumers never read a half-written export
+    tmp_path = out_dir / f"{filename}.part"
+    started = time.perf_counter()
+    total = 0
+    sink = SINKS[fmt](tmp_path, columns, types)
+    try:
+        with metrics.timer('export'):
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                sink.write(rows)
+                total += len(rows)
+                logger.debug("Exported %d %s rows so far", total, table)
+    except Exception:
+        sink.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    sink.close()
+
+    if since_last and not total:
+        tmp_path.unlink(missing_ok=True)
+        logger.info(f"No {table} rows changed since {since}")
+    else:
+        os.replace(tmp_path, path)
+        elapsed = time.perf_counter() - started
+        logger.info(f"Exported {total} {table} rows to {path} in {elapsed:.1f}s "
+                    f"({total / elapsed if elapsed > 0 else 0:.0f} rows/sec)")
+    metrics.count('rows_exported', total)
+    save_watermark(conn, name, cutoff, total)
+    return total
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export the scraped movies and series tables without loading them into memory.")
+    parser.add_argument('--format', choices=sorted(SINKS), default='parquet' if pa else 'jsonl',
+                        help="output format (default: parquet when pyarrow is installed, otherwise jsonl)")
+    parser.add_argument('--out', type=Path, default=EXPORT_DIR, help=f"output directory (default: {EXPORT_DIR})")
+    parser.add_argument('--tables', nargs='+', choices=EXPORT_TABLES, default=list(EXPORT_TABLES),
+                        help="tables to export (default: both)")
+    parser.add_argument('--since-last', action='store_true',
+                        help="only export rows changed since the previous export to the same directory and format")
+    parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+                        help=f"rows fetched and written at a time (default: {EXPORT_CHUNK_SIZE})")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.format == 'parquet' and pa is None:
+        raise SystemExit("Parquet export requires pyarrow: pip install pyarrow")
+    init_db()
+    conn = sqlite3.connect(DATABASE_PATH, timeout=SQLITE_BUSY_TIMEOUT)
+    try:
+        for table in args.tables:
+            try:
+                export_table(conn, table, args.format, args.out, args.since_last, max(1, args.chunk_size))
+            except (sqlite3.DatabaseError, OSError) as e:
+                logger.error(f"Error exporting {table}: {e}")
+    finally:
+        conn.close()
@@ -0,0 +1,244 @@
+import threading
+import time
+from collections import namedtuple
+import requests
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlparse
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from logger import logger
+import metrics
+from ratelimit import CircuitBreaker, RateLimiter, backoff_delay, retry_after_seconds
+from config import (BASE_URL, REQUEST_TIMEOUT, USER_AGENT, MAX_CONNECTIONS_PER_HOST, POOL_CONNECTIONS, POOL_MAXSIZE,
+                    HTTP_CACHE_ENABLED, MAX_RETRIES, RATE_LIMIT, RATE_LIMIT_MIN, RATE_LIMIT_MAX)
+
+# Statuses that mean the server wants us to slow down
+THROTTLE_STATUSES = {429, 503}
+# Statuses worth retrying because they are usually transient
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+try:
+    import brotli  # noqa: F401 - urllib3 decodes br responses when available
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = 'gzip, deflate, br'
+    except ImportError:
+        ACCEPT_ENCODING = 'gzip, deflate'
+
+_stats = {
+    'requests': 0,
+    'connections_opened': 0,
+    'bytes_received': 0,
+    'bytes_decoded': 0,
+    'retries': 0,
+    'throttled': 0,
+}
+_stats_lock = threading.Lock()
+_session = None
+_session_lock = threading.Lock()
+_hosts = {}
+_hosts_lock = threading.Lock()
+_cache = None
+_cache_lock = threading.Lock()
+_rate_share = 1.0
+
+def _count(key, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    """HTTP connection pool that counts newly opened connections."""
+    def _new_conn(self):
+        _count('connections_opened')
+        return super()._new_conn()
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    """HTTPS connection pool that counts newly opened connections."""
+    def _new_conn(self):
+        _count('connections_opened')
+        return super()._new_conn()
+
+class CountingAdapter(HTTPAdapter):
+    """Transport adapter whose pools report how many connections they open."""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': CountingHTTPConnectionPool,
+            'https': CountingHTTPSConnectionPool,
+        }
+
+def get_session():
+    """Return the shared keep-alive session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            session.headers.update({'User-Agent': USER_AGENT, 'Accept-Encoding': ACCEPT_ENCODING})
+            adapter = CountingAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+            logger.debug(f"Created HTTP session (pool_connections={POOL_CONNECTIONS}, pool_maxsize={POOL_MAXSIZE})")
+    return _session
+
+def get_cache():
+    """Return the shared on-disk response cache, or None when caching is disabled."""
+    global _cache
+    if not HTTP_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            from cache import ResponseCache
+            _cache = ResponseCache()
+    return _cache
+
+# Per-host politeness controls shared by every fetch path
+HostControls = namedtuple('HostControls', ['slot', 'limiter', 'breaker'])
+
+def share_rate_limit(processes):
+    """Scale this process's per-host rate limits down so that several crawling processes together stay within them."""
+    global _rate_share
+    _rate_share = 1.0 / max(1, processes)
+
+def host_controls(url):
+    """Return the concurrency slot, rate limiter and circuit breaker for the host of the given URL."""
+    host = urlparse(url).netloc or urlparse(BASE_URL).netloc
+    with _hosts_lock:
+        controls = _hosts.get(host)
+        if controls is None:
+            limiter = RateLimiter(RATE_LIMIT * _rate_share, RATE_LIMIT_MIN * _rate_share, RATE_LIMIT_MAX * _rate_share)
+            controls = HostControls(threading.BoundedSemaphore(MAX_CONNECTIONS_PER_HOST), limiter, CircuitBreaker())
+            _hosts[host] = controls
+    return controls
+
+def _send(url, stream, kwargs):
+    """Send a GET with rate limiting, retries with jittered backoff and a circuit breaker."""
+    host = urlparse(url).netloc
+    controls = host_controls(url)
+    for attempt in range(MAX_RETRIES + 1):
+        controls.breaker.before_request(host)
+        controls.limiter.acquire()
+        started = time.perf_counter()
+        try:
+            with controls.slot:
+                response = get_session().get(url, stream=stream, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.record_error('fetch', 'timeout' if isinstance(e, requests.Timeout) else 'connection')
+            controls.breaker.record_failure(host)
+            if attempt == MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"Request to {url} failed ({e}), retrying in {delay:.1f}s")
+            _count('retries')
+            time.sleep(delay)
+            continue
+        metrics.observe('fetch', time.perf_counter() - started)
+        _count('requests')
+
+        if response.status_code not in RETRY_STATUSES:
+            controls.breaker.record_success()
+            controls.limiter.on_success()
+            return response
+
+        metrics.record_error('fetch', f"http_{response.status_code}")
+        retry_after = None
+        if response.status_code in THROTTLE_STATUSES:
+            retry_after = retry_after_seconds(response)
+            controls.limiter.on_throttle(retry_after)
+            _count('throttled')
+        controls.breaker.record_failure(host)
+        if attempt == MAX_RETRIES:
+            return response
+        response.close()
+        delay = max(retry_after or 0.0, backoff_delay(attempt))
+        logger.warning(f"Request to {url} returned status {response.status_code}, retrying in {delay:.1f}s")
+        _count('retries')
+        time.sleep(delay)
+
+def _record_transfer(response, decoded):
+    _count('bytes_received', response.raw.tell() if response.raw is not None else decoded)
+    _count('bytes_decoded', decoded)
+
+def _cached_response(url, entry):
+    """Build a requests.Response serving a cached body."""
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response._content = entry['body']
+    response.encoding = entry['encoding']
+    if entry['content_type']:
+        response.headers['Content-Type'] = entry['content_type']
+    response.headers['X-Cache'] = 'HIT'
+    return response
+
+def get(url, stream=False, cache=False, **kwargs):
+    """GET a URL through the shared session with the configured timeout, per-host cap and rate limit.
+
+    With cache=True the on-disk response cache is consulted first: fresh entries are
+    returned without a request and stale ones are revalidated with If-None-Match /
+    If-Modified-Since, so an unchanged resource costs at most a 304.
+    """
+    kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+    response_cache = get_cache() if cache else None
+    entry = None
+    if response_cache is not None:
+        stream = False
+        entry = response_cache.lookup(url)
+        if entry is not None and response_cache.is_fresh(entry):
+            response_cache.record('hits', entry['size'])
+            return _cached_response(url, entry)
+        if entry is not None:
+            headers = dict(kwargs.pop('headers', None) or {})
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+            kwargs['headers'] = headers
+
+    response = _send(url, stream, kwargs)
+    if not stream:
+        _record_transfer(response, len(response.content))
+
+    if response_cache is not None:
+        if response.status_code == 304 and entry is not None:
+            response_cache.mark_revalidated(url)
+            response_cache.record('revalidated', entry['size'])
+            return _cached_response(url, entry)
+        response_cache.record('misses')
+        if response.status_code == 200:
+            response_cache.store(url, response.content,
+                                 content_type=response.headers.get('Content-Type'),
+                                 encoding=response.encoding,
+                                 etag=response.headers.get('ETag'),
+                                 last_modified=response.headers.get('Last-Modified'))
+    return response
+
+def iter_content(response, chunk_size):
+    """Iterate over a streamed response body, counting the bytes transferred."""
+    decoded = 0
+    try:
+        for chunk in response.iter_content(chunk_size):
+            decoded += len(chunk)
+            yield chunk
+    finally:
+        _record_transfer(response, decoded)
+        response.close()
+
+def get_stats():
+    """Return a snapshot of the request, connection and transfer counters."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['connections_reused'] = max(stats['requests'] - stats['connections_opened'], 0)
+    return stats
+
+def log_stats():
+    """Log the connection reuse rate and bytes transferred so far."""
+    stats = get_stats()
+    reuse_rate = stats['connections_reused'] / stats['requests'] * 100 if stats['requests'] else 0.0
+    logger.info(f"HTTP stats: {stats['requests']} requests, {stats['connections_opened']} connections opened, "
+                f"{stats['connections_reused']} reused ({reuse_rate:.1f}%), "
+                f"{stats['bytes_received']} bytes received ({stats['bytes_decoded']} decoded), "
+                f"{stats['retries']} retries, {stats['throttled']} throttled responses")
+    if _cache is not None:
+        _cache.log_stats()
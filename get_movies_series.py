@@ -1,8 +1,75 @@
-from movies import scrape_movies
-from series import scrape_series
+import argparse
+from pathlib import Path
 from db import init_db
+from config import SCRAPE_MODE, RUN_SUMMARY_PATH, PROMETHEUS_PATH
+from logger import logger
+import metrics
+
+def shard_arg(value):
+    """Parse a shard given as INDEX/COUNT, e.g. 2/4."""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected INDEX/COUNT, e.g. 2/4")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError("INDEX must be between 1 and COUNT")
+    return index, count
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape movies and series into the local database.")
+    parser.add_argument('--mode', choices=['incremental', 'full', 'refresh'], default=SCRAPE_MODE,
+                        help="'incremental' stops once listing pages only contain known titles, 'full' walks every page, "
+                             "'refresh' walks every page and updates known titles whose details changed")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue an interrupted crawl from its last checkpointed page and retry failed detail pages")
+    parser.add_argument('--images-only', action='store_true',
+                        help="skip scraping and only download missing posters and create missing thumbnails")
+    parser.add_argument('--profile', type=Path, metavar='PATH',
+                        help="profile the run with cProfile and save the stats to PATH")
+    parser.add_argument('--prometheus', type=Path, metavar='PATH', default=PROMETHEUS_PATH,
+                        help="also write the run metrics in Prometheus text format to PATH")
+    sharding = parser.add_mutually_exclusive_group()
+    sharding.add_argument('--shards', type=int, metavar='N',
+                          help="split the listing pages of each content type into N ranges crawled by N processes")
+    sharding.add_argument('--shard', type=shard_arg, metavar='INDEX/COUNT',
+                          help="crawl only one page range, to run shards as separate invocations")
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    init_db()
-    scrape_movies()
-    scrape_series()
\ No newline at end of file
+    args = parse_args()
+    # The scrapers pull in requests and bs4; importing them here keeps --help and argument
+    # errors instant and keeps them out of shard processes, which re-import this module
+    from movies import MOVIES, scrape_movies
+    from series import SERIES, scrape_series
+    from image_pipeline import ImagePipeline, get_pipeline
+    import checkpoint
+    import fetcher
+    with metrics.profiled(args.profile):
+        init_db()
+        if args.images_only:
+            logger.info("Skipping scraping, only downloading missing posters")
+        else:
+            if args.shards and args.shards > 1:
+                from shards import run_sharded
+                run_id = checkpoint.start_run(f"shards {args.shards}", args.resume)
+                completed = run_sharded([MOVIES, SERIES], args.shards, mode=args.mode, resume=args.resume, run_id=run_id)
+            elif args.shard:
+                from shards import run_shard
+                run_id = checkpoint.start_run("shard {}/{}".format(*args.shard), args.resume)
+                completed = run_shard([MOVIES, SERIES], *args.shard, mode=args.mode, resume=args.resume, run_id=run_id)
+            else:
+                run_id = checkpoint.start_run('sequential', args.resume)
+                # Both content types are crawled even if the first one stops early
+                completed = all([scrape_movies(mode=args.mode, resume=args.resume, run_id=run_id),
+                                 scrape_series(mode=args.mode, resume=args.resume, run_id=run_id)])
+            if completed:
+                checkpoint.finish_run(run_id)
+            else:
+                logger.warning(f"Crawl run {run_id} did not complete; run again with --resume to continue it")
+        (get_pipeline() or ImagePipeline()).drain([MOVIES, SERIES])
+        from derivatives import process_derivatives  # Loads Pillow, so only once posters are in
+        process_derivatives([MOVIES, SERIES])
+    fetcher.log_stats()
+    metrics.write_summary(RUN_SUMMARY_PATH, extra={'http': fetcher.get_stats()})
+    if args.prometheus:
+        metrics.write_prometheus(Path(args.prometheus))
\ No newline at end of file
@@ -0,0 +1,127 @@
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from logger import logger
+from db import SQL_NOW, get_connection
+from utils import download_image
+from config import IMAGE_PIPELINE, IMAGE_WORKERS, IMAGE_QUEUE_SIZE
+
+class ImagePipeline:
+    """Download posters in the background and fill in the image column once they are stored.
+
+    Scrapers enqueue (content type, title, poster URL) and move on, so metadata
+    throughput is bounded by detail-page fetches alone. At most queue_size posters
+    wait at a time; submit() blocks beyond that to keep memory bounded.
+    """
+
+    def __init__(self, workers=IMAGE_WORKERS, queue_size=IMAGE_QUEUE_SIZE):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='images')
+        self._slots = threading.BoundedSemaphore(max(1, queue_size))
+        self._lock = threading.Lock()
+        self._futures = set()
+        self._deferred = []  # Updates for rows the batch writer had not committed yet
+        self._stats = {'downloaded': 0, 'failed': 0}
+
+    def submit(self, spec, title, image_url):
+        """Queue the poster for a title; the row's image column is set once the download finishes."""
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._download, spec, title, image_url)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        with self._lock:
+            self._futures.discard(future)
+        self._slots.release()
+
+    def _download(self, spec, title, image_url):
+        image_path = download_image(image_url, title, spec.save_dir)
+        if image_path is None:
+            self._count('failed')
+            return
+        downloaded = self._count('downloaded')
+        if downloaded % 100 == 0:
+            logger.info("Image pipeline: %d posters stored so far", downloaded)
+        if not self._set_image(spec.table, title, image_path):
+            with self._lock:
+                self._deferred.append((spec.table, title, image_path))
+
+    def _set_image(self, table, title, image_path):
+        """Point a row at its stored poster, returning False when the row does not exist yet."""
+        conn = get_connection()
+        try:
+            with self._lock:
+                c = conn.execute(f"UPDATE {table} SET image = ?, modified_at = {SQL_NOW} WHERE title = ? AND image IS NULL",
+                                 (image_path, title))
+                conn.commit()
+            return c.rowcount > 0
+        except sqlite3.DatabaseError as e:
+            logger.error(f"Database error setting image for {title}: {e}")
+            return False
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+            return self._stats[key]
+
+    def wait(self):
+        """Block until every queued poster is downloaded, then apply updates held back for uncommitted rows."""
+        while True:
+            with self._lock:
+                pending = list(self._futures)
+            if not pending:
+                break
+            for future in pending:
+                future.result()
+
+        with self._lock:
+            deferred, self._deferred = self._deferred, []
+        for table, title, image_path in deferred:
+            self._set_image(table, title, image_path)
+
+    def drain(self, specs):
+        """Finish queued downloads, then download every poster still missing for the given content types."""
+        self.wait()
+        for spec in specs:
+            try:
+                rows = get_connection().execute(f'''SELECT title, image_url FROM {spec.table}
+                                                    WHERE image IS NULL AND image_url IS NOT NULL''').fetchall()
+            except sqlite3.DatabaseError as e:
+                logger.error(f"Database error reading the {spec.noun} image backlog: {e}")
+                continue
+            if rows:
+                logger.info(f"Downloading {len(rows)} missing {spec.noun} posters")
+            for title, image_url in rows:
+                self.submit(spec, title, image_url)
+        self.wait()
+        self.log_stats()
+
+    def stats(self):
+        """Return downloaded, failed and queued poster counts."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['queued'] = len(self._futures)
+        return stats
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(f"Image pipeline: {stats['downloaded']} posters stored, {stats['failed']} failed, "
+                    f"{stats['queued']} still queued")
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+def get_pipeline():
+    """Return the shared image pipeline, or None when posters are downloaded inline."""
+    global _pipeline
+    if not IMAGE_PIPELINE:
+        return None
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = ImagePipeline()
+    return _pipeline
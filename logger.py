@@ -1,17 +1,87 @@
 #logger.py
+import atexit
+import json
 import logging
 import os
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from config import LOG_FORMAT, LOG_ASYNC, LOG_MAX_BYTES, LOG_BACKUP_COUNT
 
-def setup_logger(name, log_file='movies_series.log', level=logging.INFO):
+class JsonFormatter(logging.Formatter):
+    """Format each record as one JSON object per line, including any extra= fields."""
+
+    # Attributes every LogRecord has; anything else was passed through extra=
+    RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in self.RESERVED})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def _log_uncaught(logger):
+    """Log uncaught exceptions in the main and worker threads before the process dies."""
+    def excepthook(exc_type, exc, tb):
+        if not issubclass(exc_type, KeyboardInterrupt):
+            logger.critical("Uncaught exception", exc_info=(exc_type, exc, tb))
+        sys.__excepthook__(exc_type, exc, tb)
+
+    def thread_excepthook(args):
+        if args.exc_type is not SystemExit:
+            logger.critical("Uncaught exception in thread %s", args.thread.name if args.thread else '?',
+                            exc_info=(args.exc_type, args.exc_value, args.exc_traceback))
+        threading.__excepthook__(args)
+
+    sys.excepthook = excepthook
+    threading.excepthook = thread_excepthook
+
+def setup_logger(name, log_file='movies_series.log', level=logging.INFO, fmt=LOG_FORMAT, use_queue=LOG_ASYNC):
+    """Log to a rotating file; with use_queue=True records are handed to a background thread that does the writing.
+
+    The queue listener is stopped at exit, which writes out every record still queued,
+    including the traceback of an uncaught exception.
+    """
     os.makedirs('logs', exist_ok=True)
-    handler = logging.FileHandler(f'logs/{log_file}')
-    formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+    handler = RotatingFileHandler(f'logs/{log_file}', maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                  encoding='utf-8')
+    if fmt == 'json':
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
     handler.setFormatter(formatter)
 
     logger = logging.getLogger(name)
     logger.setLevel(level)
     if not logger.handlers:
-        logger.addHandler(handler)
+        if use_queue:
+            log_queue = queue.SimpleQueue()
+            listener = QueueListener(log_queue, handler, respect_handler_level=True)
+            listener.start()
+            atexit.register(listener.stop)
+            logger.addHandler(QueueHandler(log_queue))
+        else:
+            logger.addHandler(handler)
+        _log_uncaught(logger)
     return logger
 
-logger = setup_logger('movie_scraper')
\ No newline at end of file
+def forward_to(log_queue):
+    """Send this process's log records to another process through a multiprocessing queue instead of writing them."""
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(QueueHandler(log_queue))
+
+def receive_from(log_queue):
+    """Write records forwarded by other processes with this process's handlers; stop() the returned listener when done."""
+    listener = QueueListener(log_queue, *logger.handlers)
+    listener.start()
+    return listener
+
+logger = setup_logger('movie_scraper')
@@ -0,0 +1,186 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+from logger import logger
+
+# Upper bounds in seconds of the latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Latency histogram with fixed buckets, a running sum and the largest observation."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """Approximate a quantile as the upper bound of the bucket it falls in."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total_seconds': round(self.sum, 6),
+            'mean_seconds': round(self.sum / self.count, 6) if self.count else 0.0,
+            'p50_seconds': round(self.quantile(0.5), 6),
+            'p95_seconds': round(self.quantile(0.95), 6),
+            'max_seconds': round(self.max, 6),
+        }
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_errors = {}
+_started = time.time()
+
+def observe(stage, seconds):
+    """Record how long one operation of a stage took."""
+    with _lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = Histogram()
+        histogram.observe(seconds)
+
+def count(name, amount=1):
+    """Add to a named counter, e.g. bytes received or rows inserted."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+def record_error(stage, category):
+    """Count a failure of a stage by category, e.g. ('fetch', 'http_503') or ('insert', 'database')."""
+    with _lock:
+        key = (stage, category)
+        _errors[key] = _errors.get(key, 0) + 1
+
+@contextmanager
+def timer(stage):
+    """Time the enclosed block as one operation of a stage."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started)
+
+def snapshot(reset=False):
+    """Return the raw metrics of this process so another process can merge() them, optionally starting over."""
+    with _lock:
+        raw = {
+            'histograms': {stage: (h.counts[:], h.count, h.sum, h.max) for stage, h in _histograms.items()},
+            'counters': dict(_counters),
+            'errors': dict(_errors),
+        }
+        if reset:
+            _histograms.clear()
+            _counters.clear()
+            _errors.clear()
+    return raw
+
+def merge(other):
+    """Add a snapshot() taken in another process, e.g. a crawl shard, to this process's metrics."""
+    with _lock:
+        for stage, (counts, total, seconds, largest) in other['histograms'].items():
+            histogram = _histograms.get(stage)
+            if histogram is None:
+                histogram = _histograms[stage] = Histogram()
+            histogram.counts = [a + b for a, b in zip(histogram.counts, counts)]
+            histogram.count += total
+            histogram.sum += seconds
+            histogram.max = max(histogram.max, largest)
+        for name, amount in other['counters'].items():
+            _counters[name] = _counters.get(name, 0) + amount
+        for key, amount in other['errors'].items():
+            _errors[key] = _errors.get(key, 0) + amount
+
+def summary():
+    """Return every stage histogram, counter and error count as a JSON-serialisable dict."""
+    with _lock:
+        stages = {stage: histogram.summary() for stage, histogram in sorted(_histograms.items())}
+        counters = dict(sorted(_counters.items()))
+        errors = {}
+        for (stage, category), total in sorted(_errors.items()):
+            errors.setdefault(stage, {})[category] = total
+    return {
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(_started)),
+        'elapsed_seconds': round(time.time() - _started, 3),
+        'stages': stages,
+        'counters': counters,
+        'errors': errors,
+    }
+
+def write_summary(path, extra=None):
+    """Write the run summary (plus any extra sections) as JSON."""
+    report = summary()
+    report.update(extra or {})
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2))
+    logger.info(f"Wrote run summary to {path}")
+    return report
+
+def prometheus_text():
+    """Render the metrics in the Prometheus text exposition format."""
+    lines = ['# TYPE scraper_stage_seconds histogram']
+    with _lock:
+        for stage, histogram in sorted(_histograms.items()):
+            cumulative = 0
+            for bound, total in zip(histogram.buckets, histogram.counts):
+                cumulative += total
+                lines.append(f'scraper_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'scraper_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'scraper_stage_seconds_sum{{stage="{stage}"}} {histogram.sum}')
+            lines.append(f'scraper_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        for name, total in sorted(_counters.items()):
+            lines.append(f'# TYPE scraper_{name}_total counter')
+            lines.append(f'scraper_{name}_total {total}')
+        lines.append('# TYPE scraper_errors_total counter')
+        for (stage, category), total in sorted(_errors.items()):
+            lines.append(f'scraper_errors_total{{stage="{stage}",category="{category}"}} {total}')
+    return '\n'.join(lines) + '\n'
+
+def write_prometheus(path):
+    """Write the metrics in Prometheus text format, e.g. for the node exporter textfile collector."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(prometheus_text())
+    logger.info(f"Wrote Prometheus metrics to {path}")
+
+@contextmanager
+def profiled(path=None, top=25):
+    """Profile the enclosed block with cProfile, saving the stats to path and logging the top functions.
+
+    cProfile only sees the calling thread, so run with CONCURRENT_SCRAPING off for a complete picture.
+    """
+    if path is None:
+        yield
+        return
+    # Imported here so runs without --profile do not pay for loading the profiler
+    import cProfile
+    import io
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(str(path))
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(top)
+        logger.info(f"Saved profile to {path}; top functions by cumulative time:\n{out.getvalue()}")
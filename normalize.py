@@ -0,0 +1,147 @@
+import re
+from datetime import datetime
+from logger import logger
+import metrics
+
+# Typed columns kept alongside the scraped TEXT columns of movies and series
+TYPED_COLUMNS = {
+    'year_num': 'INTEGER',
+    'imdb_rating': 'REAL',
+    'release_date_iso': 'TEXT',
+    'country_id': 'INTEGER',
+}
+
+# Category join table and its row id column for each content table
+CATEGORY_TABLES = {
+    'movies': ('movie_categories', 'movie_id'),
+    'series': ('series_categories', 'series_id'),
+}
+
+# Release date formats seen on details pages, e.g. "Jan 05, 2015"
+DATE_FORMATS = ('%b %d, %Y', '%B %d, %Y', '%Y-%m-%d', '%d %b %Y', '%d %B %Y', '%b %Y', '%B %Y')
+
+# Rows normalized per statement batch during a backfill
+BACKFILL_CHUNK = 1000
+
+# Titles per IN (...) query; matches db.MAX_QUERY_PARAMS, which this module cannot import since db imports it
+MAX_QUERY_PARAMS = 900
+
+_YEAR = re.compile(r'\b(1[89]\d\d|2\d\d\d)\b')
+_RATING = re.compile(r'\d+(?:\.\d+)?')
+
+def parse_year(text):
+    """Return the four-digit year in text as an int, or None."""
+    match = _YEAR.search(text or '')
+    return int(match.group(1)) if match else None
+
+def parse_rating(text):
+    """Return an IMDb rating such as "7.4" or "7.4/10" as a float between 0 and 10, or None."""
+    match = _RATING.search(text or '')
+    if not match:
+        return None
+    rating = float(match.group())
+    return rating if 0 <= rating <= 10 else None
+
+def parse_date(text):
+    """Return a release date as an ISO date string (YYYY-MM-DD, or YYYY-MM for month-only dates), or None."""
+    text = ' '.join((text or '').split())
+    for fmt in DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        return parsed.strftime('%Y-%m' if '%d' not in fmt else '%Y-%m-%d')
+    return None
+
+def split_categories(text):
+    """Split the comma-joined category column into distinct names."""
+    return list(dict.fromkeys(name.strip() for name in (text or '').split(',') if name.strip()))
+
+def ensure_schema(c):
+    """Create the lookup tables, typed columns and indexes of the normalized schema.
+
+    When the category table is new, existing rows are backfilled from their TEXT columns.
+    """
+    c.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='categories'")
+    backfill_needed = c.fetchone() is None
+
+    c.execute("CREATE TABLE IF NOT EXISTS categories (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+    c.execute("CREATE TABLE IF NOT EXISTS countries (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)")
+    for table, (join_table, id_column) in CATEGORY_TABLES.items():
+        c.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in c.fetchall()}
+        for name, type_ in TYPED_COLUMNS.items():
+            if name not in existing:
+                logger.info(f"Adding {name} column to {table} table")
+                c.execute(f"ALTER TABLE {table} ADD COLUMN {name} {type_}")
+        c.execute(f'''CREATE TABLE IF NOT EXISTS {join_table} (
+                        {id_column} INTEGER NOT NULL REFERENCES {table} (id) ON DELETE CASCADE,
+                        category_id INTEGER NOT NULL REFERENCES categories (id),
+                        PRIMARY KEY ({id_column}, category_id)
+                    ) WITHOUT ROWID''')
+        c.execute(f"CREATE INDEX IF NOT EXISTS idx_{join_table}_category ON {join_table} (category_id, {id_column})")
+        for column in ('year_num', 'imdb_rating', 'release_date_iso', 'country_id'):
+            c.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table} ({column})")
+
+    if backfill_needed:
+        for table in CATEGORY_TABLES:
+            backfill(c.connection, table)
+
+def _lookup_ids(conn, lookup_table, names):
+    """Return {name: id} for names in a lookup table, inserting the ones not stored yet."""
+    names = list(names)
+    ids = {}
+    conn.executemany(f"INSERT OR IGNORE INTO {lookup_table} (name) VALUES (?)", [(name,) for name in names])
+    for start in range(0, len(names), MAX_QUERY_PARAMS):
+        chunk = names[start:start + MAX_QUERY_PARAMS]
+        placeholders = ', '.join('?' * len(chunk))
+        ids.update(conn.execute(f"SELECT name, id FROM {lookup_table} WHERE name IN ({placeholders})", chunk))
+    return ids
+
+def normalize_rows(conn, table, rows):
+    """Fill the typed columns and category links from (id, year, imdb, release_date, country, category) rows."""
+    if not rows:
+        return
+    join_table, id_column = CATEGORY_TABLES[table]
+    countries = _lookup_ids(conn, 'countries', {row[4].strip() for row in rows if row[4] and row[4].strip()})
+    categories = {row[0]: split_categories(row[5]) for row in rows}
+    category_ids = _lookup_ids(conn, 'categories', {name for names in categories.values() for name in names})
+
+    updates = []
+    for row_id, year, imdb, release_date, country, _ in rows:
+        release_iso = parse_date(release_date)
+        year_num = parse_year(year) or (int(release_iso[:4]) if release_iso else None)
+        updates.append((year_num, parse_rating(imdb), release_iso, countries.get((country or '').strip()), row_id))
+    conn.executemany(f"UPDATE {table} SET year_num = ?, imdb_rating = ?, release_date_iso = ?, country_id = ? WHERE id = ?",
+                     updates)
+    conn.executemany(f"DELETE FROM {join_table} WHERE {id_column} = ?", [(row_id,) for row_id in categories])
+    conn.executemany(f"INSERT OR IGNORE INTO {join_table} ({id_column}, category_id) VALUES (?, ?)",
+                     [(row_id, category_ids[name]) for row_id, names in categories.items() for name in names])
+
+def normalize_titles(conn, table, titles):
+    """Refresh the normalized data of the rows with the given titles, e.g. right after a batch is written."""
+    if table not in CATEGORY_TABLES:
+        return
+    titles = list(dict.fromkeys(t for t in titles if t))
+    with metrics.timer('normalize'):
+        for start in range(0, len(titles), MAX_QUERY_PARAMS):
+            chunk = titles[start:start + MAX_QUERY_PARAMS]
+            placeholders = ', '.join('?' * len(chunk))
+            rows = conn.execute(f"""SELECT id, year, imdb, release_date, country, category FROM {table}
+                                    WHERE title IN ({placeholders})""", chunk).fetchall()
+            normalize_rows(conn, table, rows)
+
+def backfill(conn, table):
+    """Normalize every existing row of a table from its TEXT columns."""
+    last_id = 0
+    total = 0
+    while True:
+        rows = conn.execute(f"""SELECT id, year, imdb, release_date, country, category FROM {table}
+                                WHERE id > ? ORDER BY id LIMIT ?""", (last_id, BACKFILL_CHUNK)).fetchall()
+        if not rows:
+            break
+        normalize_rows(conn, table, rows)
+        last_id = rows[-1][0]
+        total += len(rows)
+    if total:
+        logger.info(f"Backfilled normalized columns for {total} {table} rows")
@@ -0,0 +1,59 @@
+from bs4 import BeautifulSoup, SoupStrainer
+from logger import logger
+import metrics
+from config import HTML_PARSER, SCOPED_PARSING
+
+def _detect_parser():
+    """Pick lxml when it is installed, falling back to the standard library parser."""
+    try:
+        import lxml  # noqa: F401
+        return 'lxml'
+    except ImportError:
+        return 'html.parser'
+
+PARSER = _detect_parser() if HTML_PARSER == 'auto' else HTML_PARSER
+logger.debug(f"Using HTML parser: {PARSER} (scoped parsing {'on' if SCOPED_PARSING else 'off'})")
+
+def _classes(attrs):
+    classes = attrs.get('class') or ''
+    return classes.split() if isinstance(classes, str) else list(classes)
+
+def _is_listing_node(name, attrs):
+    """Match the subtrees the listing scrapers read: card columns and pagination."""
+    classes = _classes(attrs)
+    return (name == 'div' and 'col-lg-2' in classes) or (name == 'ul' and 'pagination' in classes)
+
+def _is_detail_node(name, attrs):
+    """Match the subtrees the detail scrapers read: info list, country, description, tags and trailer."""
+    classes = _classes(attrs)
+    return ((name == 'ul' and 'list-separator' in classes)
+            or (name == 'h2' and 'fs-base' in classes)
+            or (name == 'p' and 'data-more' in attrs)
+            or (name == 'div' and 'card-tag' in classes)
+            or (name == 'a' and 'btn-stream' in classes))
+
+LISTING_STRAINER = SoupStrainer(_is_listing_node)
+DETAIL_STRAINER = SoupStrainer(_is_detail_node)
+
+def make_soup(markup, strainer=None, encoding=None):
+    """Parse markup with the configured engine, keeping only the strainer's subtrees when scoped parsing is on.
+
+    Bytes are decoded by the parser as it reads them, in the given encoding when known,
+    so no decoded copy of the whole page is made first.
+    """
+    return BeautifulSoup(markup, PARSER, parse_only=strainer if SCOPED_PARSING else None,
+                         from_encoding=encoding if isinstance(markup, bytes) else None)
+
+def parse_listing(markup, encoding=None):
+    """Parse a listing page."""
+    with metrics.timer('parse_listing'):
+        return make_soup(markup, LISTING_STRAINER, encoding)
+
+def parse_details(markup, encoding=None):
+    """Parse a movie or series details page."""
+    with metrics.timer('parse_details'):
+        return make_soup(markup, DETAIL_STRAINER, encoding)
+
+def release(soup):
+    """Free a parsed tree now: its parent/child links form reference cycles only the cyclic garbage collector reclaims."""
+    soup.decompose()
@@ -0,0 +1,90 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timezone
+from pathlib import PurePosixPath
+from urllib.parse import urlparse
+from logger import logger
+from db import get_connection
+import fetcher
+from config import BASE_URL, POSTER_CHUNK_SIZE
+
+# Extensions kept from the poster URL; anything else is stored as .jpg
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.avif'}
+
+def poster_url(image_url):
+    """Resolve a site-relative poster URL against BASE_URL."""
+    return image_url if image_url.startswith('http') else f"{BASE_URL}{image_url}"
+
+def poster_path(save_dir, digest, ext):
+    """Return the sharded path of a poster with the given SHA-256 digest, e.g. save_dir/ab/abcd....jpg."""
+    return f"{save_dir}/{digest[:2]}/{digest}{ext}"
+
+def _extension(url):
+    ext = PurePosixPath(urlparse(url).path).suffix.lower()
+    return ext if ext in IMAGE_EXTENSIONS else '.jpg'
+
+def lookup_poster(url):
+    """Return the stored path for a poster URL if it is recorded and still on disk."""
+    try:
+        row = get_connection().execute("SELECT path FROM posters WHERE url = ?", (url,)).fetchone()
+    except sqlite3.DatabaseError as e:
+        logger.error(f"Database error looking up poster {url}: {e}")
+        return None
+    if row and row[0] and os.path.exists(row[0]):
+        return row[0]
+    return None
+
+def record_poster(url, digest, path, size):
+    """Remember which content hash and file a poster URL resolved to."""
+    conn = get_connection()
+    conn.execute('''INSERT OR REPLACE INTO posters (url, sha256, path, size, fetched_at)
+                    VALUES (?, ?, ?, ?, ?)''',
+                 (url, digest, path, size, datetime.now(timezone.utc).isoformat(timespec='seconds')))
+    conn.commit()
+
+def store_poster(image_url, save_dir):
+    """Download a poster into the content-addressed store and return its path, skipping known URLs.
+
+    The body is streamed to a temporary file while it is hashed, then atomically
+    renamed to its hash-named path. Identical images fetched from different URLs
+    share one file.
+    """
+    url = poster_url(image_url)
+    existing = lookup_poster(url)
+    if existing:
+        logger.debug("Poster already stored, skipping download: %s", url)
+        return existing
+
+    response = fetcher.get(url, stream=True)
+    if response.status_code != 200:
+        response.close()
+        raise IOError(f"Status {response.status_code}")
+
+    os.makedirs(save_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=save_dir, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb', buffering=POSTER_CHUNK_SIZE) as f:
+            for chunk in fetcher.iter_content(response, POSTER_CHUNK_SIZE):
+                digest.update(chunk)
+                size += len(chunk)
+                f.write(chunk)
+
+        hexdigest = digest.hexdigest()
+        path = poster_path(save_dir, hexdigest, _extension(url))
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            logger.debug("Poster %s duplicates stored file %s", url, path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    record_poster(url, hexdigest, path, size)
+    return path
\ No newline at end of file
@@ -0,0 +1,116 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from logger import logger
+from config import (RATE_LIMIT, RATE_LIMIT_MIN, RATE_LIMIT_MAX, RATE_LIMIT_BURST, BACKOFF_BASE, BACKOFF_MAX,
+                    CIRCUIT_BREAKER_THRESHOLD, CIRCUIT_BREAKER_COOLDOWN)
+
+class CircuitOpenError(Exception):
+    """Raised when requests to a host are suspended after repeated failures."""
+
+class RateLimiter:
+    """Token bucket that adapts its rate: it halves on throttling and creeps back up on success."""
+
+    def __init__(self, rate=RATE_LIMIT, min_rate=RATE_LIMIT_MIN, max_rate=RATE_LIMIT_MAX, burst=RATE_LIMIT_BURST):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, rate)
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            wait = max(wait, self._paused_until - now)
+        if wait > 0:
+            time.sleep(wait)
+
+    def on_success(self):
+        """Additively raise the rate towards the configured maximum; a full recovery takes about 100 successes."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + (self.max_rate - self.min_rate) / 100)
+
+    def on_throttle(self, retry_after=None):
+        """Halve the rate and, if the server said so, pause all requests for retry_after seconds."""
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            rate = self.rate
+        logger.warning(f"Throttled by server, slowing down to {rate:.2f} requests/sec"
+                       + (f" and pausing {retry_after:.1f}s" if retry_after else ""))
+
+class CircuitBreaker:
+    """Stop sending requests after too many consecutive failures, then probe again after a cooldown.
+
+    Once the cooldown has passed the circuit is half-open: a single probe request is let
+    through while every other request keeps raising CircuitOpenError. The probe's
+    record_success() closes the circuit and its record_failure() re-opens it for another
+    cooldown. A probe that never reports back is replaced after one cooldown.
+    """
+
+    def __init__(self, threshold=CIRCUIT_BREAKER_THRESHOLD, cooldown=CIRCUIT_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._probe_at = None  # When the half-open probe was let through
+        self._lock = threading.Lock()
+
+    def before_request(self, host):
+        """Raise CircuitOpenError while the circuit is open or another request is probing it."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            now = time.monotonic()
+            if self._probe_at is not None:
+                if now - self._probe_at < self.cooldown:
+                    raise CircuitOpenError(f"Circuit half-open for {host}, waiting for the probe request")
+            elif now - self._opened_at < self.cooldown:
+                raise CircuitOpenError(f"Circuit open for {host} after {self._failures} consecutive failures")
+            self._probe_at = now
+            logger.info(f"Circuit half-open for {host}, sending a probe request")
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_at = None
+
+    def record_failure(self, host):
+        with self._lock:
+            self._failures += 1
+            if self._probe_at is not None:
+                self._opened_at = time.monotonic()
+                self._probe_at = None
+                logger.error(f"Probe request to {host} failed, keeping the circuit open for another {self.cooldown}s")
+            elif self._failures >= self.threshold and self._opened_at is None:
+                self._opened_at = time.monotonic()
+                logger.error(f"Opening circuit for {host} for {self.cooldown}s after {self._failures} consecutive failures")
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter for the given zero-based retry attempt."""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def retry_after_seconds(response):
+    """Parse a Retry-After header given either in seconds or as an HTTP date."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -1,13 +1,39 @@
-import requests
 import subprocess
 import sys
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
 from logger import logger
 from db import init_db, check_db
-from config import DIRECTORIES, BASE_URL, REQUEST_TIMEOUT, USER_AGENT
+from config import DIRECTORIES, BASE_URL
+
+def requirements_satisfied(requirements_file="requirements.txt"):
+    """Return True if every requirement is installed, at the pinned version for name==version lines.
+
+    Anything more elaborate than a bare name or an exact pin is left for pip to decide.
+    """
+    try:
+        lines = Path(requirements_file).read_text().splitlines()
+    except OSError:
+        return False
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        name, pinned, wanted = line.partition('==')
+        try:
+            installed = version(name.strip())
+        except (PackageNotFoundError, ValueError):
+            return False
+        if pinned and installed != wanted.strip():
+            return False
+    return True
 
 def install_requirements():
-    """Install dependencies from requirements.txt."""
+    """Install dependencies from requirements.txt unless they are already installed."""
     requirements_file = "requirements.txt"
+    if requirements_satisfied(requirements_file):
+        logger.info(f"Dependencies from {requirements_file} are already installed, skipping pip")
+        return
     try:
         logger.info(f"Installing dependencies from {requirements_file}")
         result = subprocess.run(
@@ -44,9 +70,9 @@ def create_directories():
 
 def check_site_accessibility(url=BASE_URL):
     """Check if the target site is accessible."""
+    import fetcher  # Deferred: loading requests is the slowest part of starting up
     try:
-        headers = {'User-Agent': USER_AGENT}
-        response = requests.get(url, timeout=REQUEST_TIMEOUT, headers=headers)
+        response = fetcher.get(url)
         if response.status_code == 200:
             logger.info(f"Site {url} is accessible")
             return True
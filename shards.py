@@ -0,0 +1,112 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from logger import logger, forward_to, receive_from
+from engine import crawl, discover_last_page
+from writer import QueueWriter, WriterCoordinator, WriterError
+from movies import MOVIES
+from series import SERIES
+import fetcher
+import metrics
+
+# Content types a shard can be given by name
+CONTENT_SPECS = {spec.name: spec for spec in (MOVIES, SERIES)}
+
+# Queue of the coordinating process's writer and the event it sets when writing failed, set in each worker process
+_write_queue = None
+_write_failed = None
+
+def plan_shards(last_page, count):
+    """Split listing pages 1..last_page into at most count contiguous (first, last) ranges of near-equal size."""
+    count = max(1, min(count, last_page))
+    size, extra = divmod(last_page, count)
+    ranges = []
+    first = 1
+    for index in range(count):
+        last = first + size - 1 + (1 if index < extra else 0)
+        ranges.append((first, last))
+        first = last + 1
+    return ranges if last_page > 0 else []
+
+def _init_worker(write_queue, write_failed, log_queue, processes):
+    global _write_queue, _write_failed
+    _write_queue = write_queue
+    _write_failed = write_failed
+    forward_to(log_queue)
+    fetcher.share_rate_limit(processes)
+
+def _crawl_shard(name, first_page, last_page, mode, resume, run_id):
+    if _write_failed.is_set():
+        raise WriterError("the coordinating writer stopped writing")
+    spec = CONTENT_SPECS[name]
+    completed = crawl(spec, mode, resume, pages=(first_page, last_page),
+                      writer=QueueWriter(_write_queue, spec.table, _write_failed), images=False, run_id=run_id)
+    return completed, metrics.snapshot(reset=True)
+
+def run_sharded(specs, processes, mode=None, resume=False, run_id=None):
+    """Crawl every content type split into page-range shards across a pool of worker processes.
+
+    Workers send their rows to a single writer in this process and leave posters to
+    the image pipeline drain that follows. Returns True when every shard completed.
+    """
+    plan = []
+    completed = True
+    for spec in specs:
+        try:
+            last_page = discover_last_page(spec)
+        except Exception as e:
+            logger.error(f"Error discovering {spec.name} listing pages: {e}")
+            completed = False
+            continue
+        plan.extend((spec.name, first, last) for first, last in plan_shards(last_page, processes))
+    if not plan:
+        return completed
+    logger.info(f"Crawling {len(plan)} shards with {processes} processes: "
+                + ', '.join(f"{name} {first}-{last}" for name, first, last in plan))
+
+    context = multiprocessing.get_context('spawn')
+    write_queue = context.Queue()
+    write_failed = context.Event()
+    log_queue = context.Queue()
+    listener = receive_from(log_queue)
+    coordinator = WriterCoordinator(write_queue, write_failed)
+    coordinator.start()
+    try:
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=_init_worker,
+                                 initargs=(write_queue, write_failed, log_queue, processes)) as executor:
+            futures = {executor.submit(_crawl_shard, name, first, last, mode, resume, run_id): (name, first, last)
+                       for name, first, last in plan}
+            for future in as_completed(futures):
+                name, first, last = futures[future]
+                try:
+                    shard_completed, shard_metrics = future.result()
+                    metrics.merge(shard_metrics)
+                    completed = completed and shard_completed
+                    logger.info(f"Finished {name} shard {first}-{last}"
+                                + ("" if shard_completed else " before its last page"))
+                except Exception as e:
+                    completed = False
+                    logger.error(f"Shard {name} {first}-{last} failed: {e}")
+    finally:
+        coordinator.stop()
+        listener.stop()
+    return completed and not write_failed.is_set()
+
+def run_shard(specs, index, count, mode=None, resume=False, run_id=None):
+    """Crawl only shard index (1-based) of count for every content type, for running shards as separate invocations.
+
+    Each invocation writes through its own BatchWriter; SQLite's write lock serialises them.
+    Returns True when the shard of every content type completed.
+    """
+    completed = True
+    for spec in specs:
+        try:
+            ranges = plan_shards(discover_last_page(spec), count)
+        except Exception as e:
+            logger.error(f"Error discovering {spec.name} listing pages: {e}")
+            completed = False
+            continue
+        if index > len(ranges):
+            logger.info(f"No {spec.name} pages left for shard {index}/{count}")
+            continue
+        completed = crawl(spec, mode, resume, pages=ranges[index - 1], run_id=run_id) and completed
+    return completed
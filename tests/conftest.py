@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# The scraper modules live at the repository root rather than in a package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# logger writes to logs/ under the working directory; keep test runs out of the checkout
+os.chdir(tempfile.mkdtemp(prefix='scraper-tests-'))
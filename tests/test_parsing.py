@@ -0,0 +1,54 @@
+import pytest
+from bs4 import BeautifulSoup
+import parsing
+from benchmark import CARDS_PER_PAGE, FixtureSite, KINDS
+from engine import extract_cards, extract_fields
+from movies import MOVIES
+from series import SERIES
+
+SPECS = {'movies': MOVIES, 'series': SERIES}
+PAGES = 3
+PARSERS = ['html.parser', 'lxml']
+
+@pytest.fixture(scope='module')
+def site():
+    return FixtureSite(PAGES)
+
+@pytest.fixture(params=[(parser, scoped) for parser in PARSERS for scoped in (False, True)],
+                ids=lambda combo: f"{combo[0]}-{'scoped' if combo[1] else 'full'}")
+def configured(request, monkeypatch):
+    """Run a test under one HTML_PARSER x SCOPED_PARSING combination."""
+    parser, scoped = request.param
+    if parser == 'lxml':
+        pytest.importorskip('lxml')
+    monkeypatch.setattr(parsing, 'PARSER', parser)
+    monkeypatch.setattr(parsing, 'SCOPED_PARSING', scoped)
+    return request.param
+
+def baseline(markup):
+    """Parse the whole document with the standard library parser, as the scrapers originally did."""
+    return BeautifulSoup(markup, 'html.parser')
+
+def listing_output(spec, soup, page):
+    return ([card._asdict() for card in extract_cards(spec, soup)],
+            soup.select_one(f'ul.pagination a.page-link[href*="page={page + 1}"]') is not None)
+
+@pytest.mark.parametrize('kind', KINDS)
+@pytest.mark.parametrize('page', range(1, PAGES + 2))
+def test_listing_fields_match_baseline(configured, site, kind, page):
+    spec = SPECS[kind]
+    markup = site.listing_page(kind, page)
+    expected = listing_output(spec, baseline(markup), page)
+    assert len(expected[0]) == (CARDS_PER_PAGE if page <= PAGES else 0)
+    assert listing_output(spec, parsing.parse_listing(markup.encode(), 'utf-8'), page) == expected
+    assert listing_output(spec, parsing.parse_listing(markup), page) == expected
+
+@pytest.mark.parametrize('kind', KINDS)
+@pytest.mark.parametrize('n', [0, 7, 31])
+def test_detail_fields_match_baseline(configured, site, kind, n):
+    spec = SPECS[kind]
+    markup = site.detail_page(kind, n)
+    expected = extract_fields(baseline(markup), spec.detail_fields)
+    assert all(expected.values())
+    assert extract_fields(parsing.parse_details(markup.encode(), 'utf-8'), spec.detail_fields) == expected
+    assert extract_fields(parsing.parse_details(markup), spec.detail_fields) == expected
@@ -0,0 +1,55 @@
+import pytest
+import ratelimit
+from ratelimit import CircuitBreaker, CircuitOpenError
+
+HOST = 'example.test'
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Drive the breaker's monotonic clock by hand."""
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, 'monotonic', lambda: now[0])
+    return now
+
+@pytest.fixture
+def breaker(clock):
+    """A breaker that has just opened after two failures."""
+    breaker = CircuitBreaker(threshold=2, cooldown=10)
+    breaker.record_failure(HOST)
+    breaker.record_failure(HOST)
+    return breaker
+
+def test_open_circuit_rejects_requests(breaker, clock):
+    clock[0] += 9
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request(HOST)
+
+def test_half_open_admits_a_single_probe(breaker, clock):
+    clock[0] += 10
+    breaker.before_request(HOST)
+    for _ in range(3):
+        with pytest.raises(CircuitOpenError):
+            breaker.before_request(HOST)
+
+def test_probe_success_closes_circuit(breaker, clock):
+    clock[0] += 10
+    breaker.before_request(HOST)
+    breaker.record_success()
+    breaker.before_request(HOST)
+    breaker.before_request(HOST)
+
+def test_probe_failure_reopens_circuit(breaker, clock):
+    clock[0] += 10
+    breaker.before_request(HOST)
+    breaker.record_failure(HOST)
+    clock[0] += 9
+    with pytest.raises(CircuitOpenError):
+        breaker.before_request(HOST)
+    clock[0] += 1
+    breaker.before_request(HOST)
+
+def test_lost_probe_is_replaced_after_cooldown(breaker, clock):
+    clock[0] += 10
+    breaker.before_request(HOST)
+    clock[0] += 10
+    breaker.before_request(HOST)
@@ -0,0 +1,118 @@
+import sqlite3
+import pytest
+import db
+import writer as writer_module
+from engine import _update_details, content_hash
+from movies import MOVIES
+from writer import BatchWriter, ROW_COLUMNS, WriterError, upsert_sql
+
+OLD = '2000-01-01T00:00:00+00:00'
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    """A freshly migrated database in tmp_path, on this thread's writer connection."""
+    monkeypatch.setattr(db, 'DATABASE_PATH', tmp_path / 'test.db')
+    db.init_db()
+    yield db.get_connection()
+    db.close_connection()
+
+def row(title='Alpha', **values):
+    record = dict.fromkeys(ROW_COLUMNS)
+    record.update(title=title, year='2020', description='First plot', content_hash='hash-1',
+                  last_seen=OLD, updated_at=OLD)
+    record.update(values)
+    return tuple(record[column] for column in ROW_COLUMNS)
+
+def write(*rows):
+    with BatchWriter('movies', threaded=False) as writer:
+        for r in rows:
+            writer.add(r)
+
+def stored(conn, title='Alpha'):
+    return conn.execute("SELECT description, content_hash, last_seen, updated_at, modified_at FROM movies "
+                        "WHERE title = ?", (title,)).fetchone()
+
+def age(conn, title='Alpha'):
+    """Backdate a stored row's modified_at so a later write is visible."""
+    conn.execute("UPDATE movies SET modified_at = ? WHERE title = ?", (OLD, title))
+    conn.commit()
+
+def test_upsert_skips_rows_without_a_hash():
+    sql = upsert_sql('movies', ROW_COLUMNS)
+    assert "WHERE excluded.content_hash IS NOT NULL AND movies.content_hash IS NOT excluded.content_hash" in sql
+
+def test_row_without_hash_is_inserted_when_new(conn):
+    write(row(description=None, content_hash=None, last_seen=None))
+    assert stored(conn)[:3] == (None, None, None)
+
+def test_row_without_hash_keeps_stored_row(conn):
+    write(row())
+    age(conn)
+    write(row(description=None, content_hash=None, last_seen=None, updated_at='2030-01-01T00:00:00+00:00'))
+    assert stored(conn) == ('First plot', 'hash-1', OLD, OLD, OLD)
+
+def test_unchanged_hash_is_a_no_op(conn):
+    write(row())
+    age(conn)
+    write(row(description='Other plot', last_seen='2030-01-01T00:00:00+00:00'))
+    assert stored(conn) == ('First plot', 'hash-1', OLD, OLD, OLD)
+
+def test_changed_hash_updates_row(conn):
+    write(row())
+    age(conn)
+    write(row(description='Other plot', content_hash='hash-2', last_seen='2030-01-01T00:00:00+00:00'))
+    description, digest, last_seen, _, modified_at = stored(conn)
+    assert (description, digest, last_seen) == ('Other plot', 'hash-2', '2030-01-01T00:00:00+00:00')
+    assert modified_at > OLD
+
+def test_update_details_refreshes_hash_and_timestamps(conn):
+    write(row(description=None, content_hash=None, last_seen=None))
+    age(conn)
+    details = {'release_date': '2020-05-01', 'description': 'Recovered plot', 'country': 'France',
+               'category': 'Drama', 'trailer_link': None}
+    _update_details(MOVIES, 'Alpha', '/movie/alpha', details, conn)
+    conn.commit()
+    description, digest, last_seen, updated_at, modified_at = stored(conn)
+    assert description == 'Recovered plot'
+    assert digest == content_hash({'title': 'Alpha', 'year': '2020', **details})
+    assert last_seen is not None and last_seen == updated_at > OLD
+    assert modified_at > OLD
+
+@pytest.fixture
+def failing(monkeypatch):
+    """Make each flush fail while failing['on'] is set."""
+    failing = {'on': True}
+    normalize = writer_module.normalize_titles
+    def normalize_titles(conn, table, titles):
+        if failing['on']:
+            raise sqlite3.OperationalError('database is locked')
+        normalize(conn, table, titles)
+    monkeypatch.setattr(writer_module, 'normalize_titles', normalize_titles)
+    return failing
+
+def test_failed_batch_is_retried_with_its_callbacks(conn, failing):
+    seen = []
+    writer = BatchWriter('movies', flush_interval=0, threaded=False)
+    writer.add(row())
+    writer.after_flush(lambda c: seen.append(c.execute("SELECT COUNT(*) FROM movies").fetchone()[0]))
+    assert seen == [] and stored(conn) is None
+    failing['on'] = False
+    writer.add(row('Beta'))
+    assert seen == [2]
+    assert not writer.has_failed()
+    writer.close()
+
+def test_writer_gives_up_after_max_retries(conn, failing):
+    seen = []
+    writer = BatchWriter('movies', flush_interval=0, threaded=False, max_retries=3)
+    writer.add(row())
+    writer.after_flush(seen.append)
+    writer.flush()
+    assert writer.has_failed()
+    with pytest.raises(WriterError):
+        writer.add(row('Beta'))
+    with pytest.raises(WriterError):
+        writer.after_flush(seen.append)
+    failing['on'] = False
+    writer.close()
+    assert seen == [] and stored(conn) is None
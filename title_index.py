@@ -0,0 +1,191 @@
+import argparse
+import hashlib
+import math
+import sqlite3
+import sys
+import threading
+import time
+from logger import logger
+from db import CONTENT_TABLES, existing_titles, get_connection
+import metrics
+from config import KNOWN_TITLE_INDEX, KNOWN_INDEX_SET_MAX, BLOOM_ERROR_RATE
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings: no false negatives, about error_rate false positives at capacity."""
+
+    def __init__(self, capacity, error_rate=BLOOM_ERROR_RATE):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing: k positions from the two halves of one 128-bit digest
+        digest = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest(), 'little')
+        first, second = digest >> 64, digest & 0xFFFFFFFFFFFFFFFF | 1
+        size = self.size
+        return [(first + i * second) % size for i in range(self.hashes)]
+
+    def add(self, key):
+        bits = self._bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        bits = self._bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def nbytes(self):
+        return sys.getsizeof(self._bits)
+
+class KnownTitles:
+    """In-memory index of the titles stored in a table, answering "have we seen this card?" without SQLite.
+
+    mode 'set' keeps every title in a Python set. mode 'bloom' keeps a Bloom filter and
+    confirms its positives with one database query, so misses (new titles) never touch
+    the database and hits cost a query per page as before. Titles are added as the
+    scraper queues rows, keeping the index in sync within a run.
+    """
+
+    def __init__(self, table, mode):
+        self.table = table
+        self.mode = mode
+        self._lock = threading.Lock()
+        self._titles = set() if mode == 'set' else None
+        self._bloom = None
+        self._stats = {'titles': 0, 'lookups': 0, 'lookup_seconds': 0.0, 'db_checks': 0, 'false_positives': 0,
+                       'load_seconds': 0.0}
+
+    def load(self):
+        """Read every stored title of the table into the index."""
+        started = time.perf_counter()
+        conn = get_connection()
+        count = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        if self.mode == 'bloom':
+            # Room for the catalog to double before the false positive rate climbs
+            self._bloom = BloomFilter(max(2 * count, 10000))
+        for (title,) in conn.execute(f"SELECT title FROM {self.table}"):
+            if title:
+                self._add(title)
+        self._stats['titles'] = count
+        self._stats['load_seconds'] = time.perf_counter() - started
+        logger.info(f"Loaded {count} {self.table} titles into a {self.mode} index "
+                    f"({self.memory_bytes() / 1024 / 1024:.1f} MB) in {self._stats['load_seconds']:.2f}s")
+        return self
+
+    def _add(self, title):
+        if self._titles is not None:
+            self._titles.add(title)
+        else:
+            self._bloom.add(title)
+
+    def add(self, title):
+        """Record a title the scraper is about to store."""
+        with self._lock:
+            self._add(title)
+            self._stats['titles'] += 1
+
+    def known(self, titles):
+        """Return the subset of titles already stored, like db.existing_titles()."""
+        titles = [t for t in titles if t]
+        started = time.perf_counter()
+        with metrics.timer('index_lookup'), self._lock:
+            if self._titles is not None:
+                found = {t for t in titles if t in self._titles}
+                candidates = None
+            else:
+                candidates = [t for t in titles if t in self._bloom]
+        if candidates is not None:
+            found = existing_titles(self.table, candidates) if candidates else set()
+            with self._lock:
+                self._stats['db_checks'] += 1 if candidates else 0
+                self._stats['false_positives'] += len(set(candidates) - found)
+        with self._lock:
+            self._stats['lookups'] += len(titles)
+            self._stats['lookup_seconds'] += time.perf_counter() - started
+        return found
+
+    def memory_bytes(self):
+        """Approximate memory held by the index."""
+        if self._titles is not None:
+            return sys.getsizeof(self._titles) + sum(sys.getsizeof(title) for title in self._titles)
+        return self._bloom.nbytes()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['memory_bytes'] = self.memory_bytes()
+        stats['us_per_lookup'] = stats['lookup_seconds'] / stats['lookups'] * 1e6 if stats['lookups'] else 0.0
+        return stats
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(f"Known-title index {self.table} ({self.mode}): {stats['titles']} titles, "
+                    f"{stats['memory_bytes'] / 1024 / 1024:.1f} MB, {stats['lookups']} lookups at "
+                    f"{stats['us_per_lookup']:.1f} us each, {stats['db_checks']} database checks, "
+                    f"{stats['false_positives']} false positives")
+
+def index_mode(count, mode=KNOWN_TITLE_INDEX):
+    """Resolve the configured index mode for a table of count rows.
+
+    'auto' picks a set up to KNOWN_INDEX_SET_MAX rows and database queries beyond that:
+    the pure-Python Bloom filter saves memory but looks up slower than the batched query.
+    """
+    if mode == 'auto':
+        return 'set' if count <= KNOWN_INDEX_SET_MAX else 'off'
+    return mode
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(table):
+    """Return the process-wide known-title index of a table, loading it on first use, or None when disabled."""
+    if KNOWN_TITLE_INDEX == 'off':
+        return None
+    with _indexes_lock:
+        index = _indexes.get(table)
+        if index is None:
+            try:
+                mode = index_mode(get_connection().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0])
+                if mode == 'off':
+                    logger.info(f"{table} is too large for a title set, checking titles with database queries")
+                    return None
+                index = _indexes[table] = KnownTitles(table, mode).load()
+            except sqlite3.DatabaseError as e:
+                logger.error(f"Database error loading the {table} title index, falling back to queries: {e}")
+                return None
+    return index
+
+def compare(table, sample=10000):
+    """Report the per-lookup cost of database queries and the memory, build time and lookup cost of both index kinds."""
+    titles = [row[0] for row in get_connection().execute(f"SELECT title FROM {table} LIMIT ?", (sample,))]
+    missing = [f"{title} (not stored)" for title in titles]
+    started = time.perf_counter()
+    existing_titles(table, titles)
+    hit_us = (time.perf_counter() - started) / max(1, len(titles)) * 1e6
+    started = time.perf_counter()
+    existing_titles(table, missing)
+    miss_us = (time.perf_counter() - started) / max(1, len(missing)) * 1e6
+    print(f"{table:7} query {'':>33}hit {hit_us:6.2f} us  miss {miss_us:6.2f} us")
+    for mode in ('set', 'bloom'):
+        index = KnownTitles(table, mode).load()
+        started = time.perf_counter()
+        hits = index.known(titles)
+        hit_us = (time.perf_counter() - started) / max(1, len(titles)) * 1e6
+        started = time.perf_counter()
+        index.known(missing)
+        miss_us = (time.perf_counter() - started) / max(1, len(missing)) * 1e6
+        stats = index.stats()
+        print(f"{table:7} {mode:5} {stats['titles']:>9} titles  {stats['memory_bytes'] / 1024 / 1024:8.2f} MB  "
+              f"load {stats['load_seconds']:6.2f}s  hit {hit_us:6.2f} us  miss {miss_us:6.2f} us  "
+              f"false positives {stats['false_positives']}/{len(missing)}  ({len(hits)} hits)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the memory and lookup cost of the set and Bloom filter title indexes.")
+    parser.add_argument('--sample', type=int, default=10000, help="titles looked up per table (default: 10000)")
+    args = parser.parse_args()
+    for table in CONTENT_TABLES:
+        compare(table, args.sample)
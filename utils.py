@@ -1,31 +1,97 @@
-import requests
-import re
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from logger import logger
-from config import BASE_URL, REQUEST_TIMEOUT, USER_AGENT
+import metrics
+from posters import store_poster
+from config import CONCURRENT_SCRAPING, MAX_WORKERS
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """Return the shared worker pool used for concurrent scraping."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='scraper')
+    return _executor
+
+def map_in_order(func, items):
+    """Apply func to every item, in parallel when concurrent scraping is enabled, returning results in input order."""
+    items = list(items)
+    if not CONCURRENT_SCRAPING or len(items) < 2:
+        return [func(item) for item in items]
+    return list(get_executor().map(func, items))
+
+class _Failure:
+    """Queue marker carrying an exception raised by the producer."""
+    def __init__(self, error):
+        self.error = error
+
+_DONE = object()
+
+class Prefetcher:
+    """Run an iterator on a background thread, keeping up to size items ready ahead of the consumer.
+
+    The producer blocks once size items are waiting, so memory stays bounded. An
+    exception in the producer is re-raised in the consumer after the items before it.
+    Time the consumer spends waiting for items is recorded under the given metrics stage.
+    """
+
+    def __init__(self, iterable, size, name='prefetch', stage=None):
+        self._queue = queue.Queue(maxsize=max(1, size))
+        self._stop = threading.Event()
+        self._stage = stage
+        self._thread = threading.Thread(target=self._run, args=(iter(iterable),), name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self, iterator):
+        try:
+            for item in iterator:
+                if not self._put(item):
+                    return
+        except Exception as e:
+            self._put(_Failure(e))
+        finally:
+            self._put(_DONE)
+
+    def _put(self, item):
+        # Give up once the consumer has closed the prefetcher instead of blocking forever
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def __iter__(self):
+        while True:
+            started = time.perf_counter()
+            item = self._queue.get()
+            if self._stage:
+                metrics.observe(self._stage, time.perf_counter() - started)
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+
+    def close(self):
+        """Stop the producer after its current item and wait for it; items not yet consumed are dropped."""
+        self._stop.set()
+        self._thread.join()
 
 def download_image(image_url, title, save_dir):
+    """Store the poster for a title in the content-addressed poster store and return its path."""
     try:
-        # Sanitize title to create a valid filename
-        safe_title = re.sub(r'[^\w\s-]', '', title).replace(' ', '_').lower()
-        image_name = f"{safe_title}.jpg"
-        image_path = f"{save_dir}/{image_name}"
-        
-        # Ensure the directory exists
-        import os
-        os.makedirs(save_dir, exist_ok=True)
-        
-        # Download the image
-        full_url = f"{BASE_URL}{image_url}" if not image_url.startswith('http') else image_url
-        response = requests.get(full_url, stream=True, timeout=REQUEST_TIMEOUT, headers={'User-Agent': USER_AGENT})
-        if response.status_code == 200:
-            with open(image_path, 'wb') as f:
-                for chunk in response.iter_content(1024):
-                    f.write(chunk)
-            logger.info(f"Downloaded image for {title} to {image_path}")
-            return image_path
-        else:
-            logger.error(f"Failed to download image for {title}: Status {response.status_code}")
-            return None
+        with metrics.timer('image'):
+            image_path = store_poster(image_url, save_dir)
+        logger.debug("Stored image for %s at %s", title, image_path)
+        return image_path
     except Exception as e:
         logger.error(f"Error downloading image for {title}: {e}")
+        metrics.record_error('image', type(e).__name__)
         return None
\ No newline at end of file
@@ -0,0 +1,349 @@
+import queue
+import sqlite3
+import threading
+import time
+from logger import logger
+import metrics
+from normalize import normalize_titles
+from db import SQL_NOW, get_connection, close_connection
+from config import WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL, WRITER_THREAD, WRITE_RETRIES
+
+# Columns written for every scraped movie or series row, in insert order
+ROW_COLUMNS = ('title', 'image', 'year', 'imdb', 'release_date', 'description', 'country', 'category', 'trailer_link',
+               'image_url', 'content_hash', 'last_seen', 'updated_at')
+
+# How an upsert updates columns that should not simply take the new value
+UPSERT_OVERRIDES = {
+    # Keep the stored poster and its derivatives unless the poster URL changed
+    'image': "COALESCE(excluded.image, CASE WHEN {table}.image_url IS excluded.image_url THEN {table}.image END)",
+    'image_thumb': "CASE WHEN {table}.image_url IS excluded.image_url THEN {table}.image_thumb END",
+    'image_webp': "CASE WHEN {table}.image_url IS excluded.image_url THEN {table}.image_webp END",
+}
+
+_STOP = object()
+_IDLE = object()  # WriterCoordinator queue timeout marker
+
+class WriterError(Exception):
+    """Raised when rows are added to a writer that gave up after repeated failed flushes."""
+
+def upsert_sql(table, columns, key='title'):
+    """Build an INSERT that updates the existing row for key instead, skipping rows whose content_hash is unchanged.
+
+    A row without a content_hash (its details page failed) is inserted when new but
+    never overwrites a stored row. Content rows also get modified_at set to the time
+    of the write.
+    """
+    values = ['?'] * len(columns)
+    updates = {column: f"excluded.{column}" for column in columns if column != key}
+    if 'image' in updates:
+        updates.update({column: sql.format(table=table) for column, sql in UPSERT_OVERRIDES.items()})
+    if 'content_hash' in columns:
+        columns, values = (*columns, 'modified_at'), [*values, SQL_NOW]
+        updates['modified_at'] = "excluded.modified_at"
+    sql = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(values)}) "
+           f"ON CONFLICT({key}) DO UPDATE SET {', '.join(f'{column} = {value}' for column, value in updates.items())}")
+    if 'content_hash' in columns:
+        sql += f" WHERE excluded.content_hash IS NOT NULL AND {table}.content_hash IS NOT excluded.content_hash"
+    return sql
+
+class _Callback:
+    """Queue marker carrying a function to run after the next flush."""
+    def __init__(self, func):
+        self.func = func
+
+class BatchWriter:
+    """Accumulate rows for one table and insert them with executemany in batches.
+
+    Rows are flushed once batch_size rows are buffered or flush_interval seconds
+    have passed since the last flush. With threaded=True the inserts run on a
+    dedicated thread fed by a queue, so callers never wait on disk I/O.
+
+    A row whose title already exists is updated in place, but only when it has a
+    content_hash and that differs from the stored one. Each batch's typed columns and
+    category links are refreshed in the same transaction.
+
+    A batch whose flush fails is kept, with its callbacks, and retried flush_interval
+    seconds later in front of the rows added since, so a callback never commits
+    before the rows added ahead of it.
+    After max_retries consecutive failures the writer stops writing and add() and
+    after_flush() raise WriterError, which ends the crawl.
+    """
+
+    def __init__(self, table, columns=ROW_COLUMNS, batch_size=WRITE_BATCH_SIZE,
+                 flush_interval=WRITE_FLUSH_INTERVAL, threaded=WRITER_THREAD, max_retries=WRITE_RETRIES):
+        self.table = table
+        self.columns = tuple(columns)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.threaded = threaded
+        self.max_retries = max(1, max_retries)
+        self.sql = upsert_sql(table, self.columns)
+        self._buffer = []
+        self._callbacks = []
+        self._last_flush = time.monotonic()
+        self._started = time.monotonic()
+        self._stats = {'rows': 0, 'inserted': 0, 'flushes': 0, 'flush_seconds': 0.0, 'max_flush_seconds': 0.0}
+        self._closed = False
+        self._failures = 0  # Consecutive failed flushes of the buffered batch
+        self._error = None
+        self._queue = None
+        self._thread = None
+        if threaded:
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._run, name=f"{table}-writer", daemon=True)
+            self._thread.start()
+
+    def _check(self):
+        if self._error is not None:
+            raise self._error
+
+    def has_failed(self):
+        """Return True once the writer has given up after max_retries failed flushes."""
+        return self._error is not None
+
+    def add(self, row):
+        """Buffer a row for insertion."""
+        self._check()
+        if self.threaded:
+            self._queue.put(row)
+            return
+        self._buffer.append(row)
+        self._maybe_flush()
+
+    def after_flush(self, func):
+        """Run func(conn) on the writer's connection right after the rows added so far are committed."""
+        self._check()
+        if self.threaded:
+            self._queue.put(_Callback(func))
+            return
+        self._callbacks.append(func)
+        self._maybe_flush()
+
+    def flush(self):
+        """Write all buffered rows now, waiting for the writer thread when threaded."""
+        if self.threaded:
+            done = threading.Event()
+            self._queue.put(done)
+            while not done.wait(0.5):
+                if not self._thread.is_alive():
+                    break
+        else:
+            self._write()
+
+    def close(self):
+        """Flush remaining rows, stop the writer thread and log throughput."""
+        if self._closed:
+            return
+        self._closed = True
+        if self.threaded:
+            self._queue.put(_STOP)
+            self._thread.join()
+        else:
+            self._write()
+        if self._buffer or self._callbacks:
+            logger.error(f"Writer {self.table} closed with {len(self._buffer)} rows and {len(self._callbacks)} "
+                         f"callbacks not written")
+        self.log_stats()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def stats(self):
+        """Return row counts, rows/sec and flush latency figures."""
+        stats = dict(self._stats)
+        elapsed = time.monotonic() - self._started
+        stats['rows_per_second'] = stats['rows'] / elapsed if elapsed > 0 else 0.0
+        stats['avg_flush_seconds'] = stats['flush_seconds'] / stats['flushes'] if stats['flushes'] else 0.0
+        return stats
+
+    def log_stats(self):
+        stats = self.stats()
+        logger.info(f"Writer {self.table}: {stats['rows']} rows ({stats['inserted']} inserted) in {stats['flushes']} flushes, "
+                    f"{stats['rows_per_second']:.1f} rows/sec, avg flush {stats['avg_flush_seconds'] * 1000:.1f} ms, "
+                    f"max flush {stats['max_flush_seconds'] * 1000:.1f} ms")
+
+    def _maybe_flush(self):
+        if self._failures and time.monotonic() - self._last_flush < self.flush_interval:
+            return  # Give a failed batch flush_interval seconds before retrying it
+        if len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self._write()
+
+    def _write(self):
+        self._last_flush = time.monotonic()
+        if self._error is not None or (not self._buffer and not self._callbacks):
+            return
+        rows, self._buffer = self._buffer, []
+        callbacks, self._callbacks = self._callbacks, []
+        started = time.perf_counter()
+        conn = get_connection()
+        try:
+            c = conn.cursor()
+            c.executemany(self.sql, rows)
+            inserted = c.rowcount if rows else 0
+            if rows and 'title' in self.columns:
+                normalize_titles(conn, self.table, [row[self.columns.index('title')] for row in rows])
+            for func in callbacks:
+                func(conn)
+            conn.commit()
+        except sqlite3.DatabaseError as e:
+            conn.rollback()
+            logger.error(f"Database error writing {len(rows)} rows to {self.table}: {e}")
+            metrics.record_error('insert', 'database')
+            self._retry_later(rows, callbacks, e)
+            return
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Unexpected error writing {len(rows)} rows to {self.table}: {e}")
+            metrics.record_error('insert', 'unexpected')
+            self._retry_later(rows, callbacks, e)
+            return
+        self._failures = 0
+        if not rows:
+            return
+        elapsed = time.perf_counter() - started
+        metrics.observe('insert', elapsed)
+        metrics.count('rows_inserted', inserted)
+        self._stats['rows'] += len(rows)
+        self._stats['inserted'] += inserted
+        self._stats['flushes'] += 1
+        self._stats['flush_seconds'] += elapsed
+        self._stats['max_flush_seconds'] = max(self._stats['max_flush_seconds'], elapsed)
+        logger.debug("Flushed %d rows to %s (%d inserted) in %.1f ms", len(rows), self.table, inserted, elapsed * 1000)
+
+    def _retry_later(self, rows, callbacks, error):
+        """Put a failed batch back in front of the buffer, or give up after max_retries consecutive failures."""
+        self._buffer[:0] = rows
+        self._callbacks[:0] = callbacks
+        self._failures += 1
+        if self._failures >= self.max_retries:
+            self._error = WriterError(f"Writing to {self.table} failed {self._failures} times in a row: {error}")
+            logger.error(f"{self._error}; stopping writes with {len(self._buffer)} rows pending")
+
+    def _run(self):
+        try:
+            while True:
+                timeout = max(0.0, self.flush_interval - (time.monotonic() - self._last_flush))
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    self._write()
+                    continue
+                if item is _STOP:
+                    self._write()
+                    break
+                if isinstance(item, _Callback):
+                    self._callbacks.append(item.func)
+                    self._maybe_flush()
+                    continue
+                if isinstance(item, threading.Event):
+                    self._write()
+                    item.set()
+                    continue
+                self._buffer.append(item)
+                self._maybe_flush()
+        except Exception as e:
+            logger.error(f"Writer thread for {self.table} failed: {e}")
+        finally:
+            close_connection()
+
+class QueueWriter:
+    """BatchWriter stand-in for worker processes that sends rows and callbacks to a WriterCoordinator.
+
+    Every process hands its rows to the one coordinator, so only a single connection
+    writes scraped rows to the database. Callbacks must be picklable, e.g. a partial
+    of a module-level function. Once the coordinator sets the shared failed event,
+    add() and after_flush() raise WriterError, which ends the crawl.
+    """
+
+    def __init__(self, queue, table, failed=None):
+        self.queue = queue
+        self.table = table
+        self.failed = failed
+
+    def has_failed(self):
+        return self.failed is not None and self.failed.is_set()
+
+    def _check(self):
+        if self.has_failed():
+            raise WriterError(f"The coordinating writer stopped writing; not sending more {self.table} rows")
+
+    def add(self, row):
+        self._check()
+        self.queue.put(('row', self.table, row))
+
+    def after_flush(self, func):
+        self._check()
+        self.queue.put(('callback', self.table, func))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+class WriterCoordinator:
+    """Drain a multiprocessing queue fed by QueueWriters into one BatchWriter per table on a background thread.
+
+    If a write fails for good, the failed event (shared with the QueueWriters) is set
+    and the queue is still drained until stop(), discarding what arrives, so workers
+    never block on a full queue.
+    """
+
+    def __init__(self, queue, failed=None, flush_interval=WRITE_FLUSH_INTERVAL):
+        self.queue = queue
+        self.failed = failed if failed is not None else threading.Event()
+        self.flush_interval = flush_interval
+        self._writers = {}
+        self._thread = threading.Thread(target=self._run, name='writer-coordinator', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """Write everything still queued and close the per-table writers."""
+        self.queue.put(None)
+        self._thread.join()
+
+    def _writer(self, table):
+        writer = self._writers.get(table)
+        if writer is None:
+            writer = self._writers[table] = BatchWriter(table, threaded=False, flush_interval=self.flush_interval)
+        return writer
+
+    def _run(self):
+        discarded = 0
+        try:
+            while True:
+                try:
+                    message = self.queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    message = _IDLE
+                if message is None:
+                    break
+                if self.failed.is_set():
+                    discarded += message is not _IDLE
+                    continue
+                try:
+                    if message is _IDLE:
+                        for writer in self._writers.values():
+                            writer.flush()
+                    else:
+                        kind, table, payload = message
+                        if kind == 'row':
+                            self._writer(table).add(payload)
+                        else:
+                            self._writer(table).after_flush(payload)
+                    if any(writer.has_failed() for writer in self._writers.values()):
+                        raise WriterError("a table writer gave up after repeated failed flushes")
+                except Exception as e:
+                    logger.error(f"Writer coordinator failed, stopping the crawl: {e}")
+                    self.failed.set()
+        finally:
+            if discarded:
+                logger.error(f"Writer coordinator discarded {discarded} rows and callbacks sent after it failed")
+            for writer in self._writers.values():
+                writer.close()
+            close_connection()